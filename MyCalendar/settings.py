@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
+import datetime
 import os
 from pathlib import Path
 
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
+    "core.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -82,9 +85,40 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": "db",
         "PORT": "5432",
+        # connections are persistent, see DB_HEALTH_CHECKS
+        "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", 60)),
     }
 }
 
+# Persistent connections are checked on their first use in each request and reopened
+# if they are broken (e.g. after restart of database), like CONN_HEALTH_CHECKS of newer Django versions
+
+DB_HEALTH_CHECKS = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Cached descriptions and versions (ETags) should be shared by all worker processes,
+# so redis at REDIS_URL is used when it is set. Local memory cache works without outside
+# services, but it is seen only by one process, so it is for a single worker only
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 100_000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -117,6 +151,106 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Event occurrences
+# Instances of events are materialized up to now + OCCURRENCES_HORIZON,
+# run "manage.py extend_occurrences" periodically to move it forward
+
+OCCURRENCES_HORIZON = datetime.timedelta(days=365)
+
+OCCURRENCES_BATCH_SIZE = 1000
+
+
+# Busy index
+# In-process LRU cache of merged busy intervals used by free time slot search.
+# Entries are invalidated by signals of this process and expire after BUSY_INDEX_TTL,
+# entry is built from FREE_SLOT_MAX_EXAMINED occupied slots at most
+
+BUSY_INDEX_MAX_USERS = 50_000
+
+BUSY_INDEX_HORIZON = datetime.timedelta(days=30)
+
+BUSY_INDEX_TTL = datetime.timedelta(minutes=5)
+
+
+# Free time slot search
+# Slots are searched inside [now, now + horizon], horizon param is FREE_SLOT_MAX_HORIZON at most
+# (and by default). Search of request stops after FREE_SLOT_MAX_EXAMINED occupied slots of users,
+# so its time is bounded even for group which has no free slot at all
+
+FREE_SLOT_MAX_HORIZON = datetime.timedelta(days=365)
+
+FREE_SLOT_MAX_COUNT = 100
+
+FREE_SLOT_MAX_EXAMINED = 100_000
+
+
+# Bitset engine of free time slot search ("engine=bitset", requires numpy)
+# Busy intervals inside window are rasterized into cells of given resolution
+
+FREE_SLOT_BITSET_WINDOW = datetime.timedelta(days=30)
+
+FREE_SLOT_BITSET_RESOLUTION = datetime.timedelta(minutes=5)
+
+
+# Bulk import of events ("api/create/events")
+# Events are inserted in batches (size can be lowered by "batch_size" param),
+# emails of invited users are resolved in chunks
+
+BULK_IMPORT_BATCH_SIZE = 1000
+
+BULK_IMPORT_MAX_BATCH_SIZE = 10_000
+
+BULK_IMPORT_EMAILS_CHUNK_SIZE = 1000
+
+
+# API responses
+# JSON is compact unless indent is set, bodies of at least API_GZIP_MIN_LENGTH bytes
+# are gzipped for clients which accept it
+
+API_JSON_INDENT = None
+
+API_GZIP_MIN_LENGTH = 1024
+
+
+# Description cache
+# Descriptions of events are cached per visibility variant and keyed by version of event
+
+DESCRIPTION_CACHE_ALIAS = "default"
+
+DESCRIPTION_CACHE_TIMEOUT = 60 * 60
+
+
+# Versions of events and users
+# Versions are bumped by signals (see core/signals.py) and used as keys of cached
+# descriptions and as ETags of info endpoints
+
+VERSIONS_CACHE_ALIAS = "default"
+
+
+# Profiling
+# When enabled, requests with "X-Profile" header (1, cprofile or tracemalloc) are profiled,
+# the last PROFILING_BUFFER_SIZE profiles are shown to staff users at "api/debug/profiles"
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED") == "1"
+
+PROFILING_BUFFER_SIZE = 100
+
+# number of functions of cProfile stats and lines of tracemalloc allocations
+PROFILING_TOP = 30
+
+
+# Metrics
+# Metrics are shown in Prometheus text format at "api/metrics" to METRICS_ALLOWED_ADDRESSES.
+# Every process writes its metrics to METRICS_DIR at most once per METRICS_FLUSH_INTERVAL seconds,
+# so any worker shows metrics of all workers (without METRICS_DIR only its own ones)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+
+METRICS_FLUSH_INTERVAL = 1
+
+METRICS_ALLOWED_ADDRESSES = ("127.0.0.1", "::1")
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 
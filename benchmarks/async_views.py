@@ -0,0 +1,104 @@
+"""
+Requests per second of sync views (WSGI handler, one thread per concurrent request)
+compared with their async versions (ASGI handler, concurrent requests in one event loop)
+
+Run: python -m benchmarks.async_views
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import report, test_database
+from benchmarks.data import generate
+
+CONCURRENCY = (1, 10, 50)
+REQUESTS = 200
+
+
+def sync_requests_per_second(urls, concurrency, cookies):
+    from django.test import Client
+
+    def worker(urls):
+        client = Client()
+        client.cookies = cookies
+        for url in urls:
+            assert client.get(url).status_code == 200, url
+
+    chunks = [urls[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(worker, chunks))
+    return len(urls) / (time.perf_counter() - started)
+
+
+def async_requests_per_second(urls, concurrency, cookies):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    client.cookies = cookies
+
+    async def worker(urls):
+        for url in urls:
+            response = await client.get(url)
+            assert response.status_code == 200, url
+
+    async def run():
+        chunks = [urls[i::concurrency] for i in range(concurrency)]
+        await asyncio.gather(*(worker(chunk) for chunk in chunks))
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return len(urls) / (time.perf_counter() - started)
+
+
+def main():
+    from django.db.models import Count
+    from django.test import Client
+
+    from core.models import Event, User
+
+    generate(1_000)
+    user = (
+        User.objects.annotate(events_count=Count("event"))
+        .order_by("-events_count", "id")
+        .first()
+    )
+    # session is created once and shared by clients of all threads
+    client = Client()
+    client.force_login(user)
+    event_ids = list(Event.objects.order_by("id").values_list("id", flat=True)[:50])
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True)[:5])
+    endpoints = {
+        "info_event": [f"info/event/{event_ids[i % 50]}" for i in range(REQUESTS)],
+        "info_user_events": [
+            f"info/user/{user.id}/events?from=2022-01-01T00:00:00&till=2030-01-01T00:00:00&limit=100"
+        ]
+        * REQUESTS,
+        "free_time_slot": [
+            f"timetable/free_time_slot?user_ids={','.join(map(str, user_ids))}&duration=1:00:00"
+        ]
+        * REQUESTS,
+    }
+    for endpoint, urls in endpoints.items():
+        for concurrency in CONCURRENCY:
+            for mode, measure in (
+                ("sync", sync_requests_per_second),
+                ("async", async_requests_per_second),
+            ):
+                prefix = "/api/async/" if mode == "async" else "/api/"
+                rps = measure(
+                    [prefix + url for url in urls], concurrency, client.cookies
+                )
+                report(
+                    "async_views",
+                    endpoint=endpoint,
+                    mode=mode,
+                    concurrency=concurrency,
+                    requests=len(urls),
+                    requests_per_second=round(rps, 1),
+                )
+
+
+if __name__ == "__main__":
+    with test_database():
+        main()
@@ -0,0 +1,83 @@
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import django
+
+
+def report(benchmark, **fields):
+    """
+    Print one benchmark result as a JSON line, so results can be compared between commits
+    """
+    print(json.dumps({"benchmark": benchmark, **fields}, default=str))
+    sys.stdout.flush()
+
+
+def best_of(func, repeat=3):
+    """
+    Return the best wall time (seconds) of several runs of func
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def measure(func, repeat=5):
+    """
+    Best, median and worst wall time (seconds) of several runs of func
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return {
+        "min": round(times[0], 6),
+        "median": round(times[len(times) // 2], 6),
+        "max": round(times[-1], 6),
+    }
+
+
+def git_commit():
+    """
+    Commit of working tree, so results of different commits can be told apart
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def test_database():
+    """
+    Set up Django and a throwaway test database, the same way "manage.py test" does
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MyCalendar.settings")
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
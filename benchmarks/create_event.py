@@ -0,0 +1,42 @@
+"""
+Latency of /api/create/event depending on number of invited emails
+
+Run: python -m benchmarks.create_event
+"""
+from benchmarks.common import best_of, report, test_database
+
+INVITED_COUNTS = (10, 1_000, 10_000)
+
+
+def main():
+    from django.test import Client
+
+    from core.models import User
+
+    owner = User.objects.create(first_name="Owner", username="owner")
+    User.objects.bulk_create(
+        User(first_name="Guest", username=f"guest{i}", email=f"guest{i}@example.com")
+        for i in range(max(INVITED_COUNTS))
+    )
+    client = Client()
+    client.force_login(owner)
+    for count in INVITED_COUNTS:
+        data = {
+            "title": "Benchmark event",
+            "start": "2022-04-20T08:00:00Z",
+            "end": "2022-04-20T10:00:00Z",
+            "is_recurring": "True",
+            "repeats": ["daily", "weekly"],
+            "invited_emails": [f"guest{i}@example.com" for i in range(count)],
+        }
+        seconds = best_of(
+            lambda: client.post(
+                "/api/create/event", data=data, content_type="application/json"
+            )
+        )
+        report("create_event", invited_emails=count, seconds=round(seconds, 4))
+
+
+if __name__ == "__main__":
+    with test_database():
+        main()
@@ -0,0 +1,145 @@
+"""
+Deterministic synthetic data for benchmarks: users, events (plain, recurring with all kinds of RRules,
+private), invites in all statuses and materialized occurrences
+
+The same seed and base time always give the same data
+"""
+import datetime
+import random
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+EVENTS_PER_USER = 10
+RECURRING_SHARE = 0.3
+PRIVATE_SHARE = 0.2
+MAX_INVITES_PER_EVENT = 3
+# events start inside [base - SPREAD, base + SPREAD]
+SPREAD = datetime.timedelta(days=60)
+STEP = datetime.timedelta(minutes=15)
+
+
+def parse_scale(scale):
+    """
+    Number of events for scale name ("1k", "100k", "1m") or plain number
+    """
+    if scale in SCALES:
+        return SCALES[scale]
+    return int(scale)
+
+
+def generate(events_count, seed=0, base=None, materialize_days=30, batch_size=10_000):
+    """
+    Insert events_count events with their owners, repeats and invites (signals are not sent)
+    Occurrences are materialized up to base + materialize_days, 0 leaves events not materialized
+    Returns counts of inserted objects
+    """
+    from django.core.management.color import no_style
+    from django.db import connection
+    from django.db.models import Max
+    from django.utils import timezone
+
+    from core.common.min_generator import min_stream
+    from core.models import Event, EventOccurrence, Invite, RRule, User
+
+    rnd = random.Random(seed)
+    if base is None:
+        base = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    till_time = base + datetime.timedelta(days=materialize_days)
+    rrule_kinds = (RRule.daily, RRule.weekly, RRule.monthly, RRule.yearly)
+    statuses = list(Invite.Status)
+
+    # ids are assigned here, so objects can be linked without reading them back
+    first_user_id = (User.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+    first_event_id = (Event.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+    users_count = max(EVENTS_PER_USER, events_count // EVENTS_PER_USER)
+    User.objects.bulk_create(
+        (
+            User(
+                id=first_user_id + i,
+                username=f"bench_user{first_user_id + i}",
+                first_name=f"User{i}",
+                email=f"bench_user{first_user_id + i}@example.com",
+            )
+            for i in range(users_count)
+        ),
+        batch_size=batch_size,
+    )
+
+    counts = {"users": users_count, "events": 0, "private_events": 0}
+    counts.update(rrules=0, invites=0, occurrences=0)
+    for batch_start in range(0, events_count, batch_size):
+        events, rrules, invites, occurrences = [], [], [], []
+        for i in range(batch_start, min(batch_start + batch_size, events_count)):
+            owner_id = first_user_id + rnd.randrange(users_count)
+            spread_steps = SPREAD // STEP
+            start = base + STEP * rnd.randrange(-spread_steps, spread_steps)
+            duration = STEP * rnd.randint(1, 12)
+            event = Event(
+                id=first_event_id + i,
+                title=f"Event {i}",
+                start=start,
+                end=start + duration,
+                owner_id=owner_id,
+                is_recurring=rnd.random() < RECURRING_SHARE,
+                is_private=rnd.random() < PRIVATE_SHARE,
+                occurrences_until=till_time if materialize_days else None,
+            )
+            events.append(event)
+
+            event_rrules = []
+            if event.is_recurring:
+                for kind in rnd.sample(rrule_kinds, rnd.randint(1, 2)):
+                    # some repeats are finite
+                    end = start + SPREAD if rnd.random() < 0.3 else None
+                    event_rrules.append(kind(event_id=event.id, start=start, end=end))
+                rrules.extend(event_rrules)
+
+            participant_ids = [owner_id]
+            guests = rnd.sample(
+                range(users_count), rnd.randint(0, MAX_INVITES_PER_EVENT)
+            )
+            for guest in guests:
+                user_id = first_user_id + guest
+                if user_id == owner_id:
+                    continue
+                status = rnd.choice(statuses)
+                invites.append(
+                    Invite(user_id=user_id, event_id=event.id, status=status)
+                )
+                if status == Invite.Status.ACCEPTED:
+                    participant_ids.append(user_id)
+
+            if materialize_days:
+                if event.is_recurring:
+                    instances = min_stream(
+                        [
+                            rrule.get_repeats(None, till_time, duration)
+                            for rrule in event_rrules
+                        ]
+                    )
+                else:
+                    instances = [(event.start, event.end)]
+                occurrences.extend(
+                    EventOccurrence(
+                        event_id=event.id, user_id=user_id, start=start, end=end
+                    )
+                    for start, end in instances
+                    if not event.is_recurring or start < till_time
+                    for user_id in participant_ids
+                )
+
+        Event.objects.bulk_create(events, batch_size=batch_size)
+        RRule.objects.bulk_create(rrules, batch_size=batch_size)
+        Invite.objects.bulk_create(invites, batch_size=batch_size)
+        EventOccurrence.objects.bulk_create(occurrences, batch_size=batch_size)
+        counts["events"] += len(events)
+        counts["private_events"] += sum(event.is_private for event in events)
+        counts["rrules"] += len(rrules)
+        counts["invites"] += len(invites)
+        counts["occurrences"] += len(occurrences)
+
+    # sequences don't know about explicitly assigned ids
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User, Event]):
+            cursor.execute(sql)
+    return counts
@@ -0,0 +1,65 @@
+"""
+Latency of /api/timetable/free_time_slot while user's history of past events grows,
+with cold busy index (search loads occupancy from database) and warm one
+
+Run: python -m benchmarks.free_time_slot
+"""
+import datetime
+
+from benchmarks.common import best_of, report, test_database
+
+HISTORY_SIZES = (10, 100, 1_000, 10_000, 100_000)
+
+
+def main():
+    from django.test import Client
+    from django.utils import timezone
+
+    from core.busy_index import busy_index
+    from core.models import Event, User
+
+    client = Client()
+    now = timezone.now()
+    for size in HISTORY_SIZES:
+        user = User.objects.create(
+            first_name="Bench",
+            email=f"bench{size}@example.com",
+            username=f"bench{size}",
+        )
+        Event.objects.bulk_create(
+            Event(
+                title="Past event",
+                start=now - datetime.timedelta(hours=2 * i + 1),
+                end=now - datetime.timedelta(hours=2 * i),
+                owner_id=user.id,
+            )
+            for i in range(1, size + 1)
+        )
+        Event.objects.create(
+            title="Upcoming event",
+            start=now + datetime.timedelta(minutes=30),
+            end=now + datetime.timedelta(hours=1),
+            owner_id=user.id,
+        )
+        url = f"/api/timetable/free_time_slot?user_ids={user.id}&duration=1:00:00"
+
+        def cold(url=url):
+            busy_index.clear()
+            client.get(url)
+
+        for busy_index_state, func in (
+            ("cold", cold),
+            ("warm", lambda url=url: client.get(url)),
+        ):
+            seconds = best_of(func, repeat=5)
+            report(
+                "free_time_slot",
+                past_events=size,
+                busy_index=busy_index_state,
+                seconds=round(seconds, 5),
+            )
+
+
+if __name__ == "__main__":
+    with test_database():
+        main()
@@ -0,0 +1,74 @@
+"""
+Throughput of min_stream compared with the previous heapify-per-item implementation
+
+Run: python -m benchmarks.min_stream
+"""
+import heapq
+import random
+
+from benchmarks.common import best_of, report
+from core.common.min_generator import min_stream
+
+TOTAL_ITEMS = 50_000
+
+
+class _LegacyItem:
+    def __init__(self, it, gen):
+        self.it = it
+        self.gen = gen
+
+    def __lt__(self, other):
+        return self.it < other.it
+
+    def __next__(self):
+        return _LegacyItem(it=next(self.gen), gen=self.gen)
+
+
+def legacy_min_stream(generators):
+    items = []
+    for gen in generators:
+        try:
+            items.append(_LegacyItem(next(gen), gen))
+        except StopIteration:
+            continue
+    heapq.heapify(items)
+
+    while len(items) > 0:
+        yield items[0].it
+        try:
+            items[0] = next(items[0])
+        except StopIteration:
+            items.pop(0)
+        heapq.heapify(items)
+
+
+def make_lists(k):
+    rnd = random.Random(k)
+    per_stream = TOTAL_ITEMS // k
+    return [sorted(rnd.random() for _ in range(per_stream)) for _ in range(k)]
+
+
+def main():
+    for k in (10, 100, 1000):
+        lists = make_lists(k)
+        items = sum(len(lst) for lst in lists)
+        for name, impl in (("legacy", legacy_min_stream), ("heap", min_stream)):
+
+            def run():
+                for _ in impl([iter(lst) for lst in lists]):
+                    pass
+
+            # legacy is O(k) per item, one run is enough to see the difference
+            seconds = best_of(run, repeat=1 if name == "legacy" else 3)
+            report(
+                "min_stream",
+                impl=name,
+                k=k,
+                items=items,
+                seconds=round(seconds, 4),
+                items_per_second=round(items / seconds),
+            )
+
+
+if __name__ == "__main__":
+    main()
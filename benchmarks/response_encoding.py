@@ -0,0 +1,69 @@
+"""
+Encode time and payload size of a 10k occurrences response for every response encoding
+
+Run: python -m benchmarks.response_encoding
+"""
+import datetime
+import json
+import os
+
+import django
+
+from benchmarks.common import best_of, report
+
+OCCURRENCES = 10_000
+
+
+def make_payloads():
+    start = datetime.datetime(2022, 4, 19, 15, tzinfo=datetime.timezone.utc)
+    step, duration = datetime.timedelta(days=1), datetime.timedelta(minutes=90)
+    pretty_events = [
+        f"Start={start + i * step}, End={start + i * step + duration}, Title=Event {i}"
+        for i in range(OCCURRENCES)
+    ]
+    occurrences = [
+        {"start": start + i * step, "end": start + i * step + duration, "id": i}
+        for i in range(OCCURRENCES)
+    ]
+    return {
+        "events": {"events": pretty_events},
+        "occurrences": {"results": occurrences},
+    }
+
+
+def main():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MyCalendar.settings")
+    django.setup()
+
+    from django.core.serializers.json import DjangoJSONEncoder
+    from django.utils.text import compress_string
+
+    from core.views import response
+
+    encoders = {
+        # what every view did before the shared response layer
+        "json_indent": lambda data: json.dumps(
+            data, cls=DjangoJSONEncoder, indent=3
+        ).encode(),
+        "json_compact": response.encode_json,
+        "json_compact_gzip": lambda data: compress_string(response.encode_json(data)),
+    }
+    if response.msgpack is not None:
+        encoders["msgpack"] = response.encode_msgpack
+
+    for payload_name, payload in make_payloads().items():
+        for name, encode in encoders.items():
+            seconds = best_of(lambda: encode(payload))
+            report(
+                "response_encoding",
+                payload=payload_name,
+                encoding=name,
+                orjson=response.orjson is not None,
+                occurrences=OCCURRENCES,
+                seconds=round(seconds, 4),
+                bytes=len(encode(payload)),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Cold start and per-request latency of production serving mode (gunicorn, see gunicorn.conf.py)
+compared with runserver. Servers use database of settings, so run it where database is available:
+
+Run: docker compose run api poetry run python -m benchmarks.serving [--url /api/info/user/1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import report
+
+SERVERS = {
+    "runserver": [sys.executable, "manage.py", "runserver", "--noreload", "{bind}"],
+    "gunicorn": ["gunicorn", "-c", "gunicorn.conf.py", "MyCalendar.wsgi"],
+}
+REQUESTS = 500
+CONCURRENCY = 16
+
+
+def get(url):
+    """
+    Latency (seconds) of GET request, any HTTP status is a response
+    """
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        e.read()
+    return time.perf_counter() - started
+
+
+def wait_for_server(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            return get(url)
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise RuntimeError(f"Server didn't answer in {timeout} seconds")
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main(args):
+    bind = f"127.0.0.1:{args.port}"
+    url = f"http://{bind}{args.url}"
+    for name, command in SERVERS.items():
+        env = dict(os.environ, GUNICORN_BIND=bind)
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [part.format(bind=bind) for part in command],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            first_request = wait_for_server(url, process)
+            cold_start = time.perf_counter() - started
+
+            latencies = [get(url) for _ in range(args.requests)]
+            concurrent_started = time.perf_counter()
+            with ThreadPoolExecutor(CONCURRENCY) as executor:
+                list(executor.map(get, [url] * args.requests))
+            concurrent_seconds = time.perf_counter() - concurrent_started
+        finally:
+            process.terminate()
+            process.wait()
+
+        report(
+            "serving",
+            server=name,
+            url=args.url,
+            cold_start_seconds=round(cold_start, 3),
+            first_request_seconds=round(first_request, 4),
+            p50_seconds=round(percentile(latencies, 0.5), 5),
+            p95_seconds=round(percentile(latencies, 0.95), 5),
+            concurrency=CONCURRENCY,
+            requests_per_second=round(args.requests / concurrent_seconds, 1),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="/api/info/user/1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    main(parser.parse_args())
@@ -0,0 +1,256 @@
+"""
+Benchmark suite over deterministic synthetic data (see benchmarks/data.py):
+every endpoint of core/api_urls.py and min_stream, union_stream and recurrence expansion directly
+
+Every result is a JSON line with scale, seed and commit, so runs of different commits can be compared
+Run: python -m benchmarks.suite --scale 1k [--seed 0] [--repeat 5] [--materialize-days 30] [--only info_]
+"""
+import argparse
+import datetime
+import itertools
+import json
+import random
+
+from benchmarks.common import git_commit, measure, report, test_database
+from benchmarks.data import SCALES, generate, parse_scale
+
+
+def algorithm_benchmarks(rnd):
+    """
+    (name, params, func) of core algorithms, they don't need database
+    """
+    from core.common.min_generator import min_stream
+    from core.common.segment_union import union_stream
+
+    for k in (10, 100, 1000):
+        per_stream = 100_000 // k
+        lists = [sorted(rnd.random() for _ in range(per_stream)) for _ in range(k)]
+        segments = [
+            sorted((start, start + rnd.random() / 100) for start in lst)
+            for lst in lists
+        ]
+
+        def run_min_stream(lists=lists):
+            for _ in min_stream([iter(lst) for lst in lists]):
+                pass
+
+        def run_union_stream(segments=segments):
+            for _ in union_stream([iter(lst) for lst in segments]):
+                pass
+
+        yield "min_stream", {"k": k, "items": per_stream * k}, run_min_stream
+        yield "union_stream", {"k": k, "items": per_stream * k}, run_union_stream
+
+
+def expansion_benchmarks(base):
+    from django.db.models import Prefetch
+
+    from core.models import Event, RRule
+
+    till_time = base + datetime.timedelta(days=365)
+    for count in (100, 1000):
+        events = list(
+            Event.objects.filter(is_recurring=True)
+            .order_by("id")
+            .prefetch_related(Prefetch("rrule_set", queryset=RRule.objects.all()))[
+                :count
+            ]
+        )
+
+        def run(events=events):
+            for event in events:
+                for _ in event.get_instances(base, till_time):
+                    pass
+
+        yield "expand_recurring_events", {"events": len(events), "days": 365}, run
+
+
+def endpoint_benchmarks(client, rnd, base):
+    """
+    (name, params, func) of requests to every endpoint, func returns response
+    """
+    from django.db.models import Count
+
+    from core.busy_index import busy_index
+    from core.models import Event, Invite, User
+    from core.versions import bump_versions
+
+    # the busiest user shows worst case, a random one shows typical case
+    busiest = (
+        User.objects.annotate(events_count=Count("event"))
+        .order_by("-events_count", "id")
+        .first()
+    )
+    users = list(User.objects.order_by("id").values_list("id", flat=True))
+    typical_id = rnd.choice(users)
+    client.force_login(busiest)
+    counter = itertools.count()
+
+    def create_user():
+        i = next(counter)
+        return client.post(
+            "/api/create/user",
+            content_type="application/json",
+            data={
+                "first_name": "New",
+                "last_name": "User",
+                "email": f"new_user{i}@example.com",
+                "username": f"new_user{i}",
+                "password": "mysecretpassword",
+            },
+        )
+
+    def event_data(i):
+        return {
+            "title": f"New event {i}",
+            "start": (base + datetime.timedelta(hours=i)).isoformat(),
+            "end": (base + datetime.timedelta(hours=i + 1)).isoformat(),
+            "is_recurring": "True",
+            "repeats": ["daily", "weekly"],
+            "invited_emails": [f"bench_user{id}@example.com" for id in users[:10]],
+        }
+
+    yield "create_user", {}, create_user
+    yield "create_event", {"invited": 10}, lambda: client.post(
+        "/api/create/event",
+        content_type="application/json",
+        data=event_data(next(counter)),
+    )
+    yield "import_events", {"events": 100}, lambda: client.post(
+        "/api/create/events",
+        content_type="application/x-ndjson",
+        data="\n".join(json.dumps(event_data(next(counter))) for _ in range(100)),
+    )
+
+    for is_private in (False, True):
+        event_id = (
+            Event.objects.filter(is_private=is_private, is_recurring=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        url = f"/api/info/event/{event_id}"
+
+        def cold(url=url, event_id=event_id):
+            # like after change of event, description is computed again
+            bump_versions("event", [event_id])
+            return client.get(url)
+
+        yield "info_event", {"private": is_private, "cache": "warm"}, lambda url=url: (
+            client.get(url)
+        )
+        yield "info_event_after_change", {"private": is_private}, cold
+
+    yield "info_user", {}, lambda: client.get(f"/api/info/user/{typical_id}")
+    yield "info_invites", {"limit": 100}, lambda: client.get(
+        "/api/info/invites?limit=100"
+    )
+    yield "info_invites", {"status": "PENDING"}, lambda: client.get(
+        "/api/info/invites?status=PENDING"
+    )
+
+    for user_name, user_id in (("busiest", busiest.id), ("typical", typical_id)):
+        for days in (7, 30, 365):
+            from_time = (base - datetime.timedelta(days=days // 2)).replace(tzinfo=None)
+            till_time = from_time + datetime.timedelta(days=days)
+            url = (
+                f"/api/info/user/{user_id}/events"
+                f"?from={from_time.isoformat()}&till={till_time.isoformat()}"
+            )
+            yield "info_user_events", {"user": user_name, "days": days}, (
+                lambda url=url: client.get(url)
+            )
+            yield "info_user_events", {
+                "user": user_name,
+                "days": days,
+                "limit": 100,
+            }, lambda url=url: client.get(f"{url}&limit=100")
+
+    invite = Invite.objects.filter(user_id=busiest.id).order_by("id").first()
+    if invite is not None:
+        statuses = itertools.cycle(["ACCEPTED", "REJECTED"])
+        yield "update_invite", {}, lambda: client.put(
+            f"/api/update/invite/{invite.id}?status={next(statuses)}"
+        )
+
+    # search is bounded by horizon, so big groups without free slots are measured too
+    for group_size in (1, 5, 10, 50, 100):
+        user_ids = ",".join(map(str, users[:group_size]))
+        url = f"/api/timetable/free_time_slot?user_ids={user_ids}&duration=1:00:00&horizon=P30D"
+
+        def cold(url=url):
+            busy_index.clear()
+            return client.get(url)
+
+        yield "free_time_slot", {"users": group_size, "busy_index": "cold"}, cold
+        yield "free_time_slot", {"users": group_size, "busy_index": "warm"}, (
+            lambda url=url: client.get(url)
+        )
+        yield "free_time_slot", {
+            "users": group_size,
+            "busy_index": "warm",
+            "count": 10,
+        }, lambda url=url: client.get(f"{url}&count=10")
+
+    queries = [
+        {"user_ids": rnd.sample(users, 5), "duration": "1:00:00", "count": 3}
+        for _ in range(50)
+    ]
+
+    def free_time_slots_batch():
+        busy_index.clear()
+        return client.post(
+            "/api/timetable/free_time_slots",
+            content_type="application/json",
+            data={"queries": queries},
+        )
+
+    yield "free_time_slots_batch", {"queries": len(queries)}, free_time_slots_batch
+
+
+def main(args):
+    from django.utils import timezone
+
+    common = {"scale": args.scale, "seed": args.seed, "commit": git_commit()}
+    base = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = generate(
+        parse_scale(args.scale),
+        seed=args.seed,
+        base=base,
+        materialize_days=args.materialize_days,
+    )
+    report("suite_data", **common, **counts)
+
+    from django.test import Client
+
+    rnd = random.Random(args.seed)
+    benchmarks = itertools.chain(
+        algorithm_benchmarks(rnd),
+        expansion_benchmarks(base),
+        endpoint_benchmarks(Client(), rnd, base),
+    )
+    for name, params, func in benchmarks:
+        if args.only and not name.startswith(args.only):
+            continue
+        statuses = set()
+
+        def run():
+            response = func()
+            if response is not None:
+                statuses.add(response.status_code)
+
+        seconds = measure(run, repeat=args.repeat)
+        report(name, **common, **params, seconds=seconds, statuses=sorted(statuses))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--scale", default="1k", help=f"number of events or one of {list(SCALES)}"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--materialize-days", type=int, default=30)
+    parser.add_argument("--only", help="run only benchmarks with names of this prefix")
+    with test_database():
+        main(parser.parse_args())
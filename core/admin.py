@@ -1,5 +1,13 @@
 from django.contrib import admin
-from core.models import User, Calendar, Event, CalendarPermission, RRule, Invite
+from core.models import (
+    User,
+    Calendar,
+    Event,
+    CalendarPermission,
+    RRule,
+    Invite,
+    EventOccurrence,
+)
 
 # Register your models here.
 admin.site.register(User)
@@ -8,3 +16,4 @@ admin.site.register(Event)
 admin.site.register(CalendarPermission)
 admin.site.register(RRule)
 admin.site.register(Invite)
+admin.site.register(EventOccurrence)
@@ -1,11 +1,19 @@
 from django.urls import path
 
-from core.views import create_views, info_views, update_views, timetable_views
+from core.views import (
+    async_views,
+    create_views,
+    debug_views,
+    info_views,
+    update_views,
+    timetable_views,
+)
 
 urlpatterns = [
     # create views
     path("create/user", create_views.create_user),
     path("create/event", create_views.create_event),
+    path("create/events", create_views.import_events),
     # info views
     path("info/event/<int:event_id>", info_views.info_event),
     path("info/user/<int:user_id>", info_views.info_user),
@@ -15,4 +23,14 @@ urlpatterns = [
     path("update/invite/<int:invite_id>", update_views.update_invite),
     # timetable views
     path("timetable/free_time_slot", timetable_views.get_first_free_time_slot),
+    path("timetable/free_time_slots", timetable_views.get_free_time_slots_batch),
+    # async versions of read views (for ASGI server)
+    path("async/info/event/<int:event_id>", async_views.info_event),
+    path("async/info/invites", async_views.info_user_invites),
+    path("async/info/user/<int:user_id>/events", async_views.info_user_events),
+    path("async/timetable/free_time_slot", async_views.get_first_free_time_slot),
+    # debug views (staff only)
+    path("debug/profiles", debug_views.debug_profiles),
+    # metrics (local addresses only)
+    path("metrics", debug_views.show_metrics),
 ]
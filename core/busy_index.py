@@ -0,0 +1,126 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.common.segment_union import union_stream
+
+
+class _Entry:
+    def __init__(self, from_time, till_time, intervals, has_more):
+        self.from_time = from_time
+        self.till_time = till_time
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+        # whether there are intervals after the last stored one
+        self.has_more = has_more
+        self.built_at = time.monotonic()
+
+
+class BusyIndex:
+    """
+    In-process LRU cache of merged busy intervals of users over rolling horizon
+    Entries are invalidated by model signals (see core/signals.py) and expire after ttl,
+    because writes made by other worker processes are not seen by signals
+    """
+
+    def __init__(self, max_users, horizon, ttl):
+        self.max_users = max_users
+        self.horizon = horizon
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_occupied_time_slots(self, user, from_time):
+        """
+        Merged occupied time slots of user, which end at or after from_time
+        Database is touched only to build entry or to continue after its horizon
+        """
+        entry = self._get_entry(user, from_time)
+        for i in range(bisect.bisect_left(entry.ends, from_time), len(entry.ends)):
+            yield entry.starts[i], entry.ends[i]
+        if entry.has_more:
+            last_start, last_end = entry.starts[-1], entry.ends[-1]
+            for start, end in user.get_occupied_time_slots(from_time=last_end):
+                # slots which are inside the last interval are already yielded from entry
+                if start > last_start or end > last_end:
+                    yield start, end
+
+    def load(self, user, from_time):
+        """
+        Build entry of user unless there is a fresh one, e.g. to load several users concurrently
+        """
+        self._get_entry(user, from_time)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else None,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_entry(self, user, from_time):
+        with self._lock:
+            entry = self._entries.get(user.id)
+            if entry is not None and self._is_fresh(entry, from_time):
+                self._entries.move_to_end(user.id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # build outside of lock, concurrent builds of the same entry are harmless
+        till_time = from_time + self.horizon
+        # slots are read up to horizon and FREE_SLOT_MAX_EXAMINED of them at most before
+        # they are merged, so endless overlapping repeats are never merged forever
+        occupied = []
+        has_more = False
+        for start, end in user.get_occupied_time_slots(from_time):
+            if len(occupied) == settings.FREE_SLOT_MAX_EXAMINED:
+                has_more = True
+                break
+            occupied.append((start, end))
+            # the first slot after horizon is stored too, so search which
+            # goes past horizon doesn't need database while this one is enough
+            if start > till_time:
+                has_more = True
+                break
+        intervals = list(union_stream([iter(occupied)]))
+        entry = _Entry(from_time, till_time, intervals, has_more)
+        with self._lock:
+            self._entries[user.id] = entry
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _is_fresh(self, entry, from_time):
+        return (
+            time.monotonic() - entry.built_at < self.ttl.total_seconds()
+            and entry.from_time <= from_time
+            # roll horizon forward when half of it has passed
+            and from_time + self.horizon / 2 <= entry.till_time
+        )
+
+
+busy_index = BusyIndex(
+    max_users=settings.BUSY_INDEX_MAX_USERS,
+    horizon=settings.BUSY_INDEX_HORIZON,
+    ttl=settings.BUSY_INDEX_TTL,
+)
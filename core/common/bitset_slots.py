@@ -0,0 +1,78 @@
+import math
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, see "bitset" extra in pyproject.toml
+    np = None
+
+
+def rasterize(occupied: Iterable, origin, cells, resolution):
+    """
+    From sorted by start occupied segments [a, b] returns boolean array of length cells,
+    where cell i ([origin + i * resolution, origin + (i + 1) * resolution)) is True
+    if it intersects any segment
+    """
+    window_end = origin + cells * resolution
+    starts, ends = [], []
+    for start, end in occupied:
+        if start >= window_end:
+            break
+        starts.append((start - origin) / resolution)
+        ends.append((end - origin) / resolution)
+
+    # +1 at first busy cell and -1 after last one, busy cells have positive prefix sum
+    diff = np.zeros(cells + 1, dtype=np.int32)
+    first_cells = np.clip(np.floor(np.array(starts)), 0, cells).astype(np.int64)
+    last_cells = np.clip(np.ceil(np.array(ends)), 0, cells).astype(np.int64)
+    np.add.at(diff, first_cells, 1)
+    np.add.at(diff, last_cells, -1)
+    return np.cumsum(diff[:-1]) > 0
+
+
+def bitset_free_slots(
+    occupied_streams: Iterable[Iterable],
+    min_start,
+    duration,
+    window,
+    resolution,
+    count=1,
+) -> List[Tuple]:
+    """
+    Rasterize each stream of occupied segments over [min_start, min_start + window),
+    combine them with OR and find first count non-overlapping runs of free cells long enough
+    for duration
+    Returns list of (start, end), which is shorter than count if there are no more runs inside window
+    """
+    cells = math.ceil(window / resolution)
+    busy = np.zeros(cells, dtype=bool)
+    for occupied in occupied_streams:
+        busy |= rasterize(occupied, min_start, cells, resolution)
+
+    needed = math.ceil(duration / resolution)
+    if needed > cells:
+        return []
+    # number of busy cells in every run of needed cells
+    busy_sums = np.concatenate(([0], np.cumsum(busy, dtype=np.int64)))
+    free_runs = np.flatnonzero(busy_sums[needed:] - busy_sums[:-needed] == 0)
+    slots = []
+    next_cell = 0
+    for cell in free_runs.tolist():
+        if cell < next_cell:
+            continue
+        start = min_start + cell * resolution
+        slots.append((start, start + duration))
+        if len(slots) == count:
+            break
+        next_cell = cell + needed
+    return slots
+
+
+def bitset_free_slot(
+    occupied_streams: Iterable[Iterable], min_start, duration, window, resolution
+) -> Optional[Tuple]:
+    """
+    The first slot of bitset_free_slots or None if there is no free run inside window
+    """
+    slots = bitset_free_slots(occupied_streams, min_start, duration, window, resolution)
+    return slots[0] if slots else None
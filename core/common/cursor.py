@@ -0,0 +1,19 @@
+import base64
+import json
+
+
+def encode_cursor(position) -> str:
+    """
+    Opaque cursor for pagination from JSON serializable position
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Position encoded by encode_cursor, raises ValueError if cursor is not valid
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Cursor {cursor} is not valid") from e
@@ -0,0 +1,73 @@
+from typing import Generator, Iterable, List
+
+
+def free_slots(occupied: Iterable, min_start, duration, till=None) -> Generator:
+    """
+    From sorted by start occupied segments [a, b] returns generator of free slots
+    [start, start + duration] which start not earlier than min_start and don't overlap each other
+    Slots end not later than till, without till generator is endless
+    """
+    cursor = min_start
+    for start, end in occupied:
+        if till is not None and start > till:
+            break
+        while cursor + duration <= start:
+            yield cursor, cursor + duration
+            cursor += duration
+        if end > cursor:
+            cursor = end
+        if till is not None and cursor + duration > till:
+            return
+    while till is None or cursor + duration <= till:
+        yield cursor, cursor + duration
+        cursor += duration
+
+
+def until(occupied: Iterable, till_time) -> Generator:
+    """
+    From sorted by start occupied segments [a, b] returns ones which start not later than till_time
+    """
+    for start, end in occupied:
+        if start > till_time:
+            return
+        yield start, end
+
+
+class SearchLimitExceeded(Exception):
+    pass
+
+
+class ExaminedLimit:
+    """
+    Number of items which wrapped streams can yield in total before SearchLimitExceeded is raised,
+    so search over streams without free slots is bounded
+    """
+
+    def __init__(self, limit):
+        self.left = limit
+
+    @property
+    def exceeded(self):
+        return self.left < 0
+
+    def wrap(self, stream: Iterable) -> Generator:
+        for item in stream:
+            self.left -= 1
+            if self.left < 0:
+                raise SearchLimitExceeded
+            yield item
+
+
+def take_slots(slots: Iterable, count) -> List:
+    """
+    The first count slots, or the ones which are found before search limit is exceeded
+    """
+    taken = []
+    try:
+        for slot in slots:
+            taken.append(slot)
+            if len(taken) == count:
+                break
+    except SearchLimitExceeded:
+        pass
+    return taken
@@ -1,38 +1,41 @@
 import heapq
 from typing import Generator, Iterable
 
-
-class Item:
-    def __init__(self, it, gen):
-        self.it = it
-        self.gen = gen
-
-    def __lt__(self, other):
-        return self.it < other.it
-
-    def __next__(self):
-        return Item(it=next(self.gen), gen=self.gen)
-
-    def __repr__(self):
-        return self.it
+# called with number of merged streams of each min_stream, e.g. by core/metrics.py
+heap_size_observer = None
 
 
 def min_stream(generators: Iterable[Generator]) -> Generator:
     """
     From several "sorted inside" generators returns generator which merge input generators saving sorted ordering
+
+    Heap entries are lists [item, index, generator] which are updated in place,
+    so every yielded item costs O(log k) comparisons and no new heap entries.
+    Index breaks ties between equal items, so generators are never compared.
     """
-    items = []
-    for gen in generators:
+    heap = []
+    for index, gen in enumerate(generators):
+        gen = iter(gen)
         try:
-            items.append(Item(next(gen), gen))
+            heap.append([next(gen), index, gen])
         except StopIteration:
             continue
-    heapq.heapify(items)
+    heapq.heapify(heap)
+    if heap_size_observer is not None:
+        heap_size_observer(len(heap))
 
-    while len(items) > 0:
-        yield items[0].it
+    while len(heap) > 1:
+        entry = heap[0]
+        yield entry[0]
         try:
-            items[0] = next(items[0])
+            entry[0] = next(entry[2])
         except StopIteration:
-            items.pop(0)
-        heapq.heapify(items)
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, entry)
+
+    # only one generator is left, so it can be passed through without heap
+    if heap:
+        it, _, gen = heap[0]
+        yield it
+        yield from gen
@@ -18,5 +18,6 @@ def union_stream(generators: Iterable[Generator]) -> Generator:
             yield cur_left, cur_right
             cur_left, cur_right = left, right
         else:
-            cur_right = right
+            # segment may lie inside current one
+            cur_right = max(cur_right, right)
     yield cur_left, cur_right
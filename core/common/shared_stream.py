@@ -0,0 +1,23 @@
+from typing import Generator, Iterable
+
+
+class SharedStream:
+    """
+    Lazily buffers generator, so several consumers can iterate it from the beginning
+    while the generator itself is run only once
+    """
+
+    def __init__(self, generator: Iterable):
+        self._generator = iter(generator)
+        self._buffer = []
+
+    def __iter__(self) -> Generator:
+        i = 0
+        while True:
+            if i == len(self._buffer):
+                try:
+                    self._buffer.append(next(self._generator))
+                except StopIteration:
+                    return
+            yield self._buffer[i]
+            i += 1
@@ -1,7 +1,19 @@
+import datetime
+import random
+import unittest
+
 from django.test import TestCase
 
+from core.common.bitset_slots import bitset_free_slot, bitset_free_slots, np
+from core.common.free_slots import (
+    ExaminedLimit,
+    SearchLimitExceeded,
+    free_slots,
+    take_slots,
+)
 from core.common.min_generator import min_stream
 from core.common.segment_union import union_stream
+from core.common.shared_stream import SharedStream
 
 
 class MinStreamTestCase(TestCase):
@@ -12,9 +24,210 @@ class MinStreamTestCase(TestCase):
         stream = min_stream([g1, g2, g3])
         self.assertListEqual([-3, -2, -1, 0, 0, 0, 1, 1, 2, 4], list(stream))
 
+    def test_empty_generators(self):
+        self.assertListEqual([], list(min_stream([])))
+        g1 = (i for i in [])
+        g2 = (i for i in [1, 2])
+        g3 = (i for i in [])
+        self.assertListEqual([1, 2], list(min_stream([g1, g2, g3])))
+
+    def test_many_generators(self):
+        rnd = random.Random(0)
+        lists = [
+            sorted(rnd.randrange(100) for _ in range(rnd.randrange(20)))
+            for _ in range(50)
+        ]
+        stream = min_stream([(i for i in lst) for lst in lists])
+        self.assertListEqual(sorted(sum(lists, [])), list(stream))
+
+    def test_equal_items_are_not_compared_by_generator(self):
+        g1 = (it for it in [(1, 2), (3, 4)])
+        g2 = (it for it in [(1, 2), (3, 4)])
+        self.assertListEqual(
+            [(1, 2), (1, 2), (3, 4), (3, 4)], list(min_stream([g1, g2]))
+        )
+
 
 class UnionStreamTestCase(TestCase):
     def test_sanity(self):
         g1 = (it for it in [(-2, 1), (3, 5), (5, 8)])
         g2 = (it for it in [(-7, -5), (-5, 0), (9, 10)])
         self.assertListEqual([(-7, 1), (3, 8), (9, 10)], list(union_stream([g1, g2])))
+
+    def test_nested_segments(self):
+        g1 = (it for it in [(0, 10), (12, 13)])
+        g2 = (it for it in [(1, 2), (3, 4)])
+        self.assertListEqual([(0, 10), (12, 13)], list(union_stream([g1, g2])))
+
+
+class FreeSlotsTestCase(TestCase):
+    def test_sanity(self):
+        occupied = [(0, 3), (4, 6), (9, 10)]
+        slots = free_slots(occupied, min_start=1, duration=2)
+        self.assertListEqual(
+            [(6, 8), (10, 12), (12, 14)], [next(slots) for _ in range(3)]
+        )
+
+    def test_occupied_before_min_start(self):
+        occupied = [(-10, -5), (-1, 2)]
+        slots = free_slots(occupied, min_start=0, duration=1)
+        self.assertTupleEqual((2, 3), next(slots))
+        slots = free_slots([(-10, -5)], min_start=0, duration=1)
+        self.assertTupleEqual((0, 1), next(slots))
+
+    def test_till(self):
+        occupied = [(0, 3), (4, 6), (9, 10)]
+        self.assertListEqual(
+            [(6, 8), (10, 12)], list(free_slots(occupied, 1, duration=2, till=12))
+        )
+        self.assertListEqual([], list(free_slots(occupied, 1, duration=2, till=7)))
+
+    def test_endless_occupied_without_gaps(self):
+        def daily():
+            day = 0
+            while True:
+                yield day, day + 23
+                day += 24
+
+        self.assertListEqual(
+            [], list(free_slots(daily(), 0, duration=2, till=24 * 365))
+        )
+        # without till search is bounded by number of examined segments
+        limit = ExaminedLimit(1000)
+        self.assertListEqual(
+            [], take_slots(free_slots(limit.wrap(daily()), 0, duration=2), 3)
+        )
+        self.assertTrue(limit.exceeded)
+
+
+class ExaminedLimitTestCase(TestCase):
+    def test_limit_is_shared(self):
+        limit = ExaminedLimit(3)
+        first, second = limit.wrap(range(2)), limit.wrap(range(2))
+        self.assertListEqual([0, 1], list(first))
+        self.assertEqual(0, next(second))
+        self.assertFalse(limit.exceeded)
+        with self.assertRaises(SearchLimitExceeded):
+            next(second)
+        self.assertTrue(limit.exceeded)
+
+    def test_take_slots(self):
+        limit = ExaminedLimit(2)
+        self.assertListEqual([0, 1], take_slots(limit.wrap(range(10)), 5))
+        self.assertListEqual([0, 1, 2], take_slots(range(10), 3))
+
+
+class SharedStreamTestCase(TestCase):
+    def test_sanity(self):
+        calls = []
+
+        def gen():
+            for i in range(3):
+                calls.append(i)
+                yield i
+
+        stream = SharedStream(gen())
+        first, second = iter(stream), iter(stream)
+        self.assertEqual(0, next(first))
+        self.assertListEqual([0, 1, 2], list(second))
+        self.assertListEqual([1, 2], list(first))
+        self.assertListEqual([0, 1, 2], calls)
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class BitsetFreeSlotTestCase(TestCase):
+    origin = datetime.datetime(2022, 4, 19, 12, 0, tzinfo=datetime.timezone.utc)
+    resolution = datetime.timedelta(minutes=5)
+    window = datetime.timedelta(days=2)
+
+    def random_timeline(self, rnd, step=datetime.timedelta(minutes=1)):
+        # sorted overlapping segments with precision of step
+        timeline = []
+        start = self.origin - datetime.timedelta(hours=1)
+        minutes = step // datetime.timedelta(minutes=1)
+        for _ in range(rnd.randrange(30)):
+            start += step * rnd.randrange(120 // minutes)
+            end = start + step * rnd.randrange(1, 90 // minutes)
+            timeline.append((start, end))
+        return timeline
+
+    def exact_free_slot(self, timelines, duration):
+        occupied = union_stream([iter(timeline) for timeline in timelines])
+        return next(free_slots(occupied, self.origin, duration))
+
+    def test_aligned_matches_union_stream(self):
+        minutes = datetime.timedelta(minutes=1)
+        timelines = [
+            [(self.origin - 10 * minutes, self.origin + 15 * minutes)],
+            [
+                (self.origin + 20 * minutes, self.origin + 60 * minutes),
+                (self.origin + 90 * minutes, self.origin + 95 * minutes),
+            ],
+        ]
+        for duration in (5 * minutes, 25 * minutes, 30 * minutes, 31 * minutes):
+            slot = bitset_free_slot(
+                [iter(timeline) for timeline in timelines],
+                self.origin,
+                duration,
+                self.window,
+                self.resolution,
+            )
+            self.assertTupleEqual(self.exact_free_slot(timelines, duration), slot)
+
+    def test_random_cross_check(self):
+        rnd = random.Random(0)
+        for _ in range(50):
+            timelines = [self.random_timeline(rnd) for _ in range(rnd.randrange(1, 5))]
+            duration = datetime.timedelta(minutes=rnd.randrange(1, 180))
+            exact = self.exact_free_slot(timelines, duration)
+            slot = bitset_free_slot(
+                [iter(timeline) for timeline in timelines],
+                self.origin,
+                duration,
+                self.window,
+                self.resolution,
+            )
+            # bitset engine is exact up to resolution and never overlaps busy segments
+            self.assertLessEqual(exact[0], slot[0])
+            for start, end in sum(timelines, []):
+                self.assertTrue(end <= slot[0] or slot[1] <= start)
+
+    def test_random_aligned_cross_check(self):
+        rnd = random.Random(0)
+        for _ in range(50):
+            timelines = [
+                self.random_timeline(rnd, self.resolution)
+                for _ in range(rnd.randrange(1, 5))
+            ]
+            duration = self.resolution * rnd.randrange(1, 36)
+            slot = bitset_free_slot(
+                [iter(timeline) for timeline in timelines],
+                self.origin,
+                duration,
+                self.window,
+                self.resolution,
+            )
+            # segments and duration are aligned to cells, so nothing is rounded
+            self.assertTupleEqual(self.exact_free_slot(timelines, duration), slot)
+
+    def test_several_slots(self):
+        hour = datetime.timedelta(hours=1)
+        busy = [(self.origin + hour, self.origin + 2 * hour)]
+        duration = datetime.timedelta(minutes=40)
+        slots = bitset_free_slots(
+            [iter(busy)], self.origin, duration, self.window, self.resolution, count=3
+        )
+        occupied = union_stream([iter(busy)])
+        exact = free_slots(occupied, self.origin, duration)
+        self.assertListEqual([next(exact) for _ in range(3)], slots)
+
+    def test_no_slot_in_window(self):
+        busy = [(self.origin, self.origin + self.window)]
+        slot = bitset_free_slot(
+            [iter(busy)],
+            self.origin,
+            datetime.timedelta(hours=1),
+            self.window,
+            self.resolution,
+        )
+        self.assertIsNone(slot)
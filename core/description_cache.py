@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from core.models import Event
+from core.versions import get_version
+
+
+class DescriptionCache:
+    """
+    Descriptions of events cached per visibility variant ("deep" or "hidden")
+    Keys include version of event, which is bumped by model signals (see core/signals.py),
+    so stale descriptions are never read and just expire after timeout
+    """
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get_description(self, event_id, user_id):
+        """
+        Description of event which user is allowed to see, None if there is no such event
+        """
+        cache = caches[self.alias]
+        prefix = f"event_description:{event_id}:{get_version('event', event_id)}"
+        keys = {name: f"{prefix}:{name}" for name in ("visibility", "deep", "hidden")}
+        cached = cache.get_many(keys.values())
+
+        event = None
+        visibility = cached.get(keys["visibility"])
+        if visibility is None:
+            event = Event.objects.filter(id=event_id).select_related("owner").first()
+            if event is None:
+                return None
+            visibility = (event.is_private, event.get_related_user_ids())
+            cache.set(keys["visibility"], visibility, self.timeout)
+
+        is_private, related_user_ids = visibility
+        variant = "hidden" if is_private and user_id not in related_user_ids else "deep"
+        description = cached.get(keys[variant])
+        if description is not None:
+            self.hits += 1
+            return description
+
+        self.misses += 1
+        if event is None:
+            event = Event.objects.filter(id=event_id).select_related("owner").first()
+            if event is None:
+                return None
+        if variant == "deep":
+            description = event.deep_description()
+        else:
+            description = event.hidden_description()
+        cache.set(keys[variant], description, self.timeout)
+        return description
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else None,
+        }
+
+
+description_cache = DescriptionCache(
+    alias=settings.DESCRIPTION_CACHE_ALIAS, timeout=settings.DESCRIPTION_CACHE_TIMEOUT
+)
@@ -0,0 +1,35 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = "Materialize event occurrences up to now + OCCURRENCES_HORIZON (run it periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horizon-days",
+            type=int,
+            help="Override OCCURRENCES_HORIZON setting",
+        )
+
+    def handle(self, *args, **options):
+        horizon = settings.OCCURRENCES_HORIZON
+        if options["horizon_days"] is not None:
+            horizon = datetime.timedelta(days=options["horizon_days"])
+        till_time = timezone.now() + horizon
+
+        events = Event.objects.filter(
+            Q(occurrences_until__isnull=True)
+            | Q(is_recurring=True, occurrences_until__lt=till_time)
+        )
+        count = 0
+        for event in events.iterator():
+            event.extend_occurrences(till_time)
+            count += 1
+        self.stdout.write(f"Materialized {count} events up to {till_time}")
@@ -0,0 +1,376 @@
+import asyncio
+import bisect
+import contextvars
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from core.common import min_generator
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10_000, 100_000)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def describe(self):
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": samples,
+        }
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Histogram(Counter):
+    """
+    Counts of observed values per bucket (the last one is +Inf) and their sum
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            value_state = self._values.get(key)
+            if value_state is None:
+                value_state = {"counts": [0] * (len(self.buckets) + 1), "sum": 0}
+                self._values[key] = value_state
+            value_state["counts"][index] += 1
+            value_state["sum"] += value
+
+    def describe(self):
+        with self._lock:
+            samples = [
+                [list(key), {"counts": list(state["counts"]), "sum": state["sum"]}]
+                for key, state in self._values.items()
+            ]
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "buckets": list(self.buckets),
+            "samples": samples,
+        }
+
+
+class Registry:
+    """
+    In-process metrics. Each process writes its snapshot to METRICS_DIR (see flush),
+    so metrics of all worker processes are aggregated by collect
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """
+        Register function which returns described metrics of other objects at snapshot time
+        """
+        self.collectors.append(func)
+        return func
+
+    def snapshot(self):
+        snapshot = {metric.name: metric.describe() for metric in self.metrics}
+        for collector in self.collectors:
+            snapshot.update(collector())
+        return snapshot
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with self._flush_lock:
+            # file is replaced atomically, so readers never see it half-written
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f"{path}.tmp", path)
+            self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        if (
+            settings.METRICS_DIR
+            and time.monotonic() - self._flushed_at >= settings.METRICS_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def collect(self):
+        """
+        Metrics of all processes which wrote to METRICS_DIR (or only of this one)
+        """
+        directory = settings.METRICS_DIR
+        if not directory:
+            snapshot = self.snapshot()
+        else:
+            self.flush()
+            snapshots = []
+            for path in glob.glob(os.path.join(directory, "*.json")):
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+            snapshot = merge(snapshots)
+        snapshot.update(cache_hit_ratios(snapshot))
+        return snapshot
+
+
+def merge(snapshots):
+    """
+    Sum of samples with the same labels of several snapshots
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif metric["type"] == "histogram":
+                    target["samples"][key] = {
+                        "counts": [
+                            a + b for a, b in zip(current["counts"], value["counts"])
+                        ],
+                        "sum": current["sum"] + value["sum"],
+                    }
+                else:
+                    target["samples"][key] = current + value
+    for metric in merged.values():
+        metric["samples"] = [list(item) for item in metric["samples"].items()]
+    return merged
+
+
+def cache_hit_ratios(snapshot):
+    requests = snapshot.get("cache_requests_total")
+    if requests is None:
+        return {}
+    totals = {}
+    for (cache, result), value in requests["samples"]:
+        totals.setdefault(cache, {"hit": 0, "miss": 0})[result] += value
+    samples = [
+        [[cache], counts["hit"] / (counts["hit"] + counts["miss"])]
+        for cache, counts in totals.items()
+        if counts["hit"] + counts["miss"]
+    ]
+    return {
+        "cache_hit_ratio": {
+            "type": "gauge",
+            "help": "Share of cache requests which were hits",
+            "labelnames": ["cache"],
+            "samples": samples,
+        }
+    }
+
+
+def render(snapshot):
+    """
+    Prometheus text format of snapshot
+    """
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric["samples"], key=lambda it: it[0]):
+            labels = list(zip(metric["labelnames"], labels))
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + [math.inf], value["counts"]):
+                cumulative += count
+                bucket_labels = _format_labels(labels + [("le", _format_number(bound))])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            lines.append(
+                f"{name}_sum{_format_labels(labels)} {_format_number(value['sum'])}"
+            )
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(value)
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Latency of requests per route",
+    ("route", "method", "status"),
+)
+REQUEST_QUERIES = registry.histogram(
+    "http_request_db_queries",
+    "Number of database queries per request",
+    ("route",),
+    COUNT_BUCKETS,
+)
+REQUEST_EXPANDED_OCCURRENCES = registry.histogram(
+    "http_request_expanded_occurrences",
+    "Number of instances of events expanded from RRules per request",
+    ("route",),
+    COUNT_BUCKETS,
+)
+MIN_STREAM_HEAP_SIZE = registry.histogram(
+    "min_stream_heap_size",
+    "Number of merged streams in heap of min_stream",
+    buckets=COUNT_BUCKETS,
+)
+min_generator.heap_size_observer = MIN_STREAM_HEAP_SIZE.observe
+
+
+@registry.collector
+def collect_cache_requests():
+    from core.busy_index import busy_index
+    from core.description_cache import description_cache
+
+    samples = []
+    for cache, stats in (
+        ("description", description_cache.stats()),
+        ("busy_index", busy_index.stats()),
+    ):
+        samples.append([[cache, "hit"], stats["hits"]])
+        samples.append([[cache, "miss"], stats["misses"]])
+    return {
+        "cache_requests_total": {
+            "type": "counter",
+            "help": "Requests of in-process caches by result",
+            "labelnames": ["cache", "result"],
+            "samples": samples,
+        }
+    }
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.expanded_occurrences = 0
+
+
+# stats of current request, context is copied to threads of async views
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection (see core/signals.py)
+    """
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+    return execute(sql, params, many, context)
+
+
+def count_expanded_occurrences(count):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.expanded_occurrences += count
+
+
+class MetricsMiddleware:
+    """
+    Observes latency, number of database queries and of expanded occurrences of each request
+    Streamed content is produced after response is returned, so it isn't counted
+    Under ASGI requests stay async, so async views aren't run through one shared thread
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # instance is called as coroutine function by Django, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, stats, duration):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        REQUEST_DURATION.observe(
+            duration, route=route, method=request.method, status=response.status_code
+        )
+        REQUEST_QUERIES.observe(stats.queries, route=route)
+        REQUEST_EXPANDED_OCCURRENCES.observe(stats.expanded_occurrences, route=route)
+        registry.maybe_flush()
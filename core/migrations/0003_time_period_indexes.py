@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_delete_user_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["owner", "start", "end"], name="core_event_owner_i_dd34a6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invite",
+            index=models.Index(
+                fields=["user", "status"], name="core_invite_user_id_98d1b9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rrule",
+            index=models.Index(
+                fields=["event", "start", "end"], name="core_rrule_event_i_87d68e_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_time_period_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("is_recurring", False)),
+                fields=["owner", "end"],
+                name="core_event_owner_plain_end_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("is_recurring", True)),
+                fields=["owner"],
+                name="core_event_owner_recurring_idx",
+            ),
+        ),
+    ]
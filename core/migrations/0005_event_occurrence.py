@@ -0,0 +1,65 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_event_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="occurrences_until",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.CreateModel(
+            name="EventOccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField()),
+                ("end", models.DateTimeField()),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="core.event"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="core.user"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["user", "start"], name="core_evento_user_id_b1b40c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["user", "end"], name="core_evento_user_id_f90a90_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventoccurrence",
+            index=models.Index(
+                fields=["event", "start"], name="core_evento_event_i_34cd5f_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_event_occurrence"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="invite",
+            name="core_invite_user_id_98d1b9_idx",
+        ),
+        migrations.AddIndex(
+            model_name="invite",
+            index=models.Index(
+                fields=["user", "status", "id"], name="core_invite_user_id_96f022_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invite",
+            index=models.Index(
+                fields=["user", "id"], name="core_invite_user_id_29a3dc_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+EMAIL_INDEX = "core_user_email_uniq"
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Unique index can't be created while some users share email, so they are reported instead
+    """
+    User = apps.get_model("auth", "User")
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias)
+        .exclude(email="")
+        .values("email")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .order_by("email")
+        .values_list("email", flat=True)[:10]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Emails of users should be unique, change or clear emails of users "
+            f"which share them before migrating: {', '.join(duplicates)}"
+        )
+
+
+def create_email_index(apps, schema_editor):
+    # on PostgreSQL index is built without locking writes to auth_user,
+    # index which is left by failed run (invalid after failed concurrent build) is dropped first
+    drop_email_index(apps, schema_editor)
+    concurrently = (
+        "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    )
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {concurrently}{EMAIL_INDEX} "
+        "ON auth_user (email) WHERE email <> ''"
+    )
+
+
+def drop_email_index(apps, schema_editor):
+    concurrently = (
+        "CONCURRENTLY " if schema_editor.connection.vendor == "postgresql" else ""
+    )
+    schema_editor.execute(f"DROP INDEX {concurrently}IF EXISTS {EMAIL_INDEX}")
+
+
+class Migration(migrations.Migration):
+    # concurrent index can't be created inside transaction
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0006_invite_keyset_indexes"),
+    ]
+
+    # operations which can fail go first, so failed migration can be simply run again
+    operations = [
+        # auth_user is not a model of this app, so its constraint is created by SQL.
+        # Email is optional for users, so empty emails are not unique
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.RunPython(create_email_index, drop_email_index),
+        migrations.AddIndex(
+            model_name="invite",
+            index=models.Index(
+                fields=["event", "user"], name="core_invite_event_i_65ff51_idx"
+            ),
+        ),
+    ]
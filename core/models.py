@@ -1,9 +1,13 @@
 import datetime
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import User as DjangoUser
 
+from core import metrics
 from core.common.min_generator import min_stream
 
 
@@ -25,28 +29,103 @@ class User(DjangoUser):
         return Invite.objects.filter(user_id=self.id)
 
     def get_invites_by_status(self, status):
-        all_invites = self.get_all_invites()
-        return [invite for invite in all_invites if invite.status == status]
-
-    def get_my_events(self):
-        accepted_invites = self.get_invites_by_status(status=Invite.Status.ACCEPTED)
-        accepted_events = [invite.get_event() for invite in accepted_invites]
-        return list(self.get_owned_events()) + accepted_events
-
-    def get_events_instances_by_time_period(self, from_time, till_time):
+        return self.get_all_invites().filter(status=status)
+
+    def get_events_by_time_period(
+        self, from_time=None, till_time=None, not_materialized=False
+    ):
+        """
+        Owned and accepted events which may have instances intersecting [from_time, till_time]
+        Recurring events are filtered by their RRules, which are prefetched for expansion
+        With not_materialized only events with instances missing in EventOccurrence are returned
+        """
+        plain_events = Q(is_recurring=False)
+        recurring_events = Q(is_recurring=True)
+        rrules = RRule.objects.all()
+        if from_time is not None:
+            plain_events &= Q(end__gte=from_time)
+            rrules = rrules.filter(Q(end__isnull=True) | Q(end__gte=from_time))
+        if till_time is not None:
+            plain_events &= Q(start__lte=till_time)
+            rrules = rrules.filter(start__lte=till_time)
+        if not_materialized:
+            plain_events &= Q(occurrences_until__isnull=True)
+            if till_time is not None:
+                recurring_events &= Q(occurrences_until__isnull=True) | Q(
+                    occurrences_until__lte=till_time
+                )
+        recurring_events &= Exists(rrules.filter(event_id=OuterRef("id")))
+        # every combination is selected separately, so each query can use its own index
+        owned_events = Event.objects.filter(owner_id=self.id)
+        accepted_events = Event.objects.filter(
+            invite__user_id=self.id, invite__status=Invite.Status.ACCEPTED
+        ).exclude(owner_id=self.id)
         result = []
-        events = self.get_my_events()
-        for event in events:
-            for start, end in event.get_instances():
-                if start >= from_time and end <= till_time:
-                    result.append(((start, end), event))
-                if start > till_time:
-                    break
+        for events in (owned_events, accepted_events):
+            result += events.filter(plain_events)
+            result += events.filter(recurring_events).prefetch_related(
+                Prefetch("rrule_set", queryset=rrules)
+            )
         return result
 
-    def get_occupied_time_slots(self):
-        events = self.get_my_events()
-        yield from min_stream([event.get_instances() for event in events])
+    def iter_events_instances_by_time_period(self, from_time, till_time):
+        """
+        Instances ((start, end), event) inside [from_time, till_time] sorted by (start, end, event id)
+        They are produced lazily by merging sorted streams, so nothing is sorted globally
+        """
+        events = {}
+
+        def materialized_instances():
+            occurrences = (
+                EventOccurrence.objects.filter(
+                    user_id=self.id,
+                    start__gte=from_time,
+                    start__lte=till_time,
+                    end__lte=till_time,
+                )
+                .order_by("start", "end", "event_id")
+                .select_related("event")
+            )
+            for occurrence in occurrences.iterator():
+                events.setdefault(occurrence.event_id, occurrence.event)
+                yield occurrence.start, occurrence.end, occurrence.event_id
+
+        def not_materialized_instances(event):
+            for start, end in event.get_not_materialized_instances(
+                from_time, till_time
+            ):
+                if start >= from_time and end <= till_time:
+                    yield start, end, event.id
+
+        streams = [materialized_instances()]
+        for event in self.get_events_by_time_period(
+            from_time, till_time, not_materialized=True
+        ):
+            events[event.id] = event
+            streams.append(not_materialized_instances(event))
+        for start, end, event_id in min_stream(streams):
+            yield (start, end), events[event_id]
+
+    def get_events_instances_by_time_period(self, from_time, till_time):
+        return list(self.iter_events_instances_by_time_period(from_time, till_time))
+
+    def get_occupied_time_slots(self, from_time=None, till_time=None):
+        occurrences = EventOccurrence.objects.filter(user_id=self.id)
+        if from_time is not None:
+            occurrences = occurrences.filter(end__gte=from_time)
+        if till_time is not None:
+            occurrences = occurrences.filter(start__lte=till_time)
+        occurrences = occurrences.order_by("start", "end").values_list("start", "end")
+        events = self.get_events_by_time_period(
+            from_time, till_time, not_materialized=True
+        )
+        yield from min_stream(
+            [occurrences.iterator()]
+            + [
+                event.get_not_materialized_instances(from_time, till_time)
+                for event in events
+            ]
+        )
 
     def __str__(self):
         return f"{self.name} ({self.email})"
@@ -91,9 +170,28 @@ class Event(models.Model):
     is_recurring = models.BooleanField(default=False)
     is_private = models.BooleanField(default=False)
     calendars = models.ManyToManyField(Calendar)
+    # instances which start before this time are materialized as EventOccurrence
+    # (for plain event its only instance), None if event is not materialized
+    occurrences_until = models.DateTimeField(default=None, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "start", "end"]),
+            models.Index(
+                fields=["owner", "end"],
+                condition=Q(is_recurring=False),
+                name="core_event_owner_plain_end_idx",
+            ),
+            models.Index(
+                fields=["owner"],
+                condition=Q(is_recurring=True),
+                name="core_event_owner_recurring_idx",
+            ),
+        ]
 
     def get_owner(self):
-        return User.objects.filter(id=self.owner.id)[0]
+        # cached on event, free when event is loaded with select_related("owner")
+        return self.owner
 
     def get_related_user_ids(self):
         owner_id = self.owner_id
@@ -103,14 +201,97 @@ class Event(models.Model):
         return [owner_id] + invited_user_ids
 
     def get_rrules(self):
-        return RRule.objects.filter(event_id=self.id)
-
-    def get_instances(self):
+        # goes through related manager, so prefetched RRules are reused
+        return self.rrule_set.all()
+
+    def get_instances(self, from_time=None, till_time=None):
+        """
+        Instances (start, end) sorted by start which intersect [from_time, till_time]
+        None means that period is not bounded from this side
+        """
         if not self.is_recurring:
-            yield self.start, self.end
+            if (from_time is None or self.end >= from_time) and (
+                till_time is None or self.start <= till_time
+            ):
+                yield self.start, self.end
         else:
             rrules = self.get_rrules()
-            yield from min_stream([rrule.get_repeats() for rrule in rrules])
+            duration = self.end - self.start
+            yield from min_stream(
+                [rrule.get_repeats(from_time, till_time, duration) for rrule in rrules]
+            )
+
+    def get_not_materialized_instances(self, from_time=None, till_time=None):
+        """
+        Instances like get_instances, but only ones which are not stored as EventOccurrence
+        """
+        if self.occurrences_until is None:
+            yield from self.get_instances(from_time, till_time)
+            return
+        if not self.is_recurring:
+            return
+        if from_time is None or from_time < self.occurrences_until:
+            from_time = self.occurrences_until
+        for start, end in self.get_instances(from_time, till_time):
+            if start >= self.occurrences_until:
+                yield start, end
+
+    def get_participant_ids(self):
+        """
+        Users who are busy with event: owner and users who accepted invite
+        """
+        accepted_user_ids = Invite.objects.filter(
+            event_id=self.id, status=Invite.Status.ACCEPTED
+        ).values_list("user_id", flat=True)
+        return {self.owner_id, *accepted_user_ids}
+
+    def build_occurrences(self, user_ids, from_time=None, till_time=None):
+        """
+        EventOccurrence of each user for instances which start in [from_time, till_time)
+        Plain event is always taken as a whole
+        """
+        if not self.is_recurring:
+            from_time, till_time = None, None
+        return [
+            EventOccurrence(event_id=self.id, user_id=user_id, start=start, end=end)
+            for start, end in self.get_instances(from_time, till_time)
+            if (from_time is None or start >= from_time)
+            and (till_time is None or start < till_time)
+            for user_id in user_ids
+        ]
+
+    def create_occurrences(self, user_ids, from_time=None, till_time=None):
+        EventOccurrence.objects.bulk_create(
+            self.build_occurrences(user_ids, from_time, till_time),
+            batch_size=settings.OCCURRENCES_BATCH_SIZE,
+        )
+
+    def rebuild_occurrences(self, till_time=None):
+        """
+        Replace materialized instances of event, by default up to now + OCCURRENCES_HORIZON
+        """
+        if till_time is None:
+            till_time = timezone.now() + settings.OCCURRENCES_HORIZON
+        with transaction.atomic():
+            EventOccurrence.objects.filter(event_id=self.id).delete()
+            self.create_occurrences(self.get_participant_ids(), till_time=till_time)
+            self.occurrences_until = till_time
+            Event.objects.filter(id=self.id).update(occurrences_until=till_time)
+
+    def extend_occurrences(self, till_time):
+        """
+        Materialize instances which start between occurrences_until and till_time
+        """
+        if self.occurrences_until is None:
+            return self.rebuild_occurrences(till_time)
+        if not self.is_recurring or self.occurrences_until >= till_time:
+            return
+        with transaction.atomic():
+            self.create_occurrences(
+                self.get_participant_ids(), self.occurrences_until, till_time
+            )
+            self.occurrences_until = till_time
+            Event.objects.filter(id=self.id).update(occurrences_until=till_time)
 
     def deep_description(self):
         description = {
@@ -126,28 +307,11 @@ class Event(models.Model):
             rrules = self.get_rrules()
             description["repeats"] = [str(rrule) for rrule in rrules]
 
-        # add invites to description
-        invites = Invite.objects.filter(event_id=self.id)
-        pending_users = [
-            str(invite.get_user())
-            for invite in invites
-            if invite.status == Invite.Status.PENDING
-        ]
-        accepted_users = [
-            str(invite.get_user())
-            for invite in invites
-            if invite.status == Invite.Status.ACCEPTED
-        ]
-        rejected_users = [
-            str(invite.get_user())
-            for invite in invites
-            if invite.status == Invite.Status.REJECTED
-        ]
-        description["invites"] = {
-            "PENDING": pending_users,
-            "ACCEPTED": accepted_users,
-            "REJECTED": rejected_users,
-        }
+        # add invites to description, users are joined to invites in one query
+        invites = {status.name: [] for status in Invite.Status}
+        for invite in Invite.objects.filter(event_id=self.id).select_related("user"):
+            invites[Invite.Status(invite.status).name].append(str(invite.user))
+        description["invites"] = invites
 
         return description
 
@@ -174,16 +338,37 @@ class RRule(models.Model):
     interval = models.DurationField()
     end = models.DateTimeField(default=None, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "start", "end"]),
+        ]
+
     def get_event(self):
         return Event.objects.filter(id=self.event.id)[0]
 
-    def get_repeats(self):
-        event = self.get_event()
-        event_duration = event.end - event.start
+    def get_repeats(self, from_time=None, till_time=None, event_duration=None):
+        """
+        Repeats (start, end) which intersect [from_time, till_time]
+        The first one is found arithmetically, so earlier repeats are never generated
+        Event duration is taken from related event unless it is passed by caller
+        """
+        if event_duration is None:
+            event_duration = self.event.end - self.event.start
         start = self.start
-        while (self.end is None) or (start + event_duration <= self.end):
-            yield start, start + event_duration
-            start += self.interval
+        if from_time is not None and start + event_duration < from_time:
+            # smallest number of intervals to skip so that repeat ends at or after from_time
+            skip = -((start + event_duration - from_time) // self.interval)
+            start += skip * self.interval
+        count = 0
+        try:
+            while (self.end is None) or (start + event_duration <= self.end):
+                if till_time is not None and start > till_time:
+                    return
+                yield start, start + event_duration
+                count += 1
+                start += self.interval
+        finally:
+            metrics.count_expanded_occurrences(count)
 
     def __str__(self):
         return f"Repeat start={self.start} with interval={self.interval}"
@@ -242,11 +427,56 @@ class Invite(models.Model):
         default=Status.PENDING,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status", "id"]),
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["event", "user"]),
+        ]
+
     def get_event(self):
         return Event.objects.filter(id=self.event_id)[0]
 
     def get_user(self):
         return User.objects.filter(id=self.user_id)[0]
 
+    def sync_occurrences(self):
+        """
+        Materialized instances of event for invited user follow invite status
+        """
+        event = self.get_event()
+        if self.user_id == event.owner_id:
+            return
+        with transaction.atomic():
+            EventOccurrence.objects.filter(
+                event_id=event.id, user_id=self.user_id
+            ).delete()
+            if self.status == Invite.Status.ACCEPTED and event.occurrences_until:
+                event.create_occurrences(
+                    [self.user_id], till_time=event.occurrences_until
+                )
+
     def __str__(self):
         return f"id={self.id} user={self.user} event={self.event} status={self.status}"
+
+
+class EventOccurrence(models.Model):
+    """
+    Materialized instance of event for one of its participants
+    It is what read paths scan instead of expanding RRules on every request
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "start"]),
+            models.Index(fields=["user", "end"]),
+            models.Index(fields=["event", "start"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event} start={self.start} end={self.end}"
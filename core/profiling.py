@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import contextvars
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.utils import timezone
+
+import core
+
+CORE_DIR = os.path.dirname(os.path.abspath(core.__file__))
+MODELS_FILE = os.path.join(CORE_DIR, "models.py")
+# files of database execute wrappers, which are never callers
+WRAPPER_FILES = (os.path.abspath(__file__), os.path.join(CORE_DIR, "metrics.py"))
+PROFILE_MODES = ("1", "cprofile", "tracemalloc")
+
+# the last profiles, newest at the end
+profiles = collections.deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+_profile_ids = itertools.count(1)
+# recorder of current profiled request
+_current_recorder = contextvars.ContextVar("query_recorder", default=None)
+
+
+def get_caller():
+    """
+    Function of core/models.py which runs current query, or the nearest function of core app
+    """
+    nearest = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename == MODELS_FILE:
+            return f"core/models.py:{frame.f_code.co_name}"
+        if (
+            nearest is None
+            and filename.startswith(CORE_DIR)
+            and filename not in WRAPPER_FILES
+        ):
+            relative = os.path.relpath(filename, os.path.dirname(CORE_DIR))
+            nearest = f"{relative}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return nearest or "(outside of core)"
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper which counts queries and their time per caller
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.callers = collections.defaultdict(lambda: {"queries": 0, "sql_time": 0.0})
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.time += elapsed
+            caller = self.callers[get_caller()]
+            caller["queries"] += 1
+            caller["sql_time"] += elapsed
+
+    def top_callers(self):
+        callers = [
+            {
+                "caller": caller,
+                "queries": stats["queries"],
+                "sql_time": stats["sql_time"],
+            }
+            for caller, stats in self.callers.items()
+        ]
+        return sorted(callers, key=lambda it: it["sql_time"], reverse=True)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection (see core/signals.py),
+    records queries of profiled request, context is copied to threads of async views
+    """
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+class _Tracing:
+    """
+    tracemalloc traces whole process, so it's started by the first of concurrent
+    profiled requests and stopped after the last one
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._started = False
+
+    def acquire(self):
+        with self._lock:
+            if self._requests == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started = True
+            self._requests += 1
+
+    def release(self):
+        with self._lock:
+            self._requests -= 1
+            if self._requests == 0 and self._started:
+                tracemalloc.stop()
+                self._started = False
+
+
+_tracing = _Tracing()
+
+
+class _Profile:
+    """
+    Profile of one request, which is measured inside with block
+    """
+
+    def __init__(self, request, mode):
+        self.request = request
+        self.mode = mode
+        self.recorder = QueryRecorder()
+        self.profiler = cProfile.Profile() if mode == "cprofile" else None
+        self.snapshot = None
+
+    def __enter__(self):
+        self.token = _current_recorder.set(self.recorder)
+        if self.mode == "tracemalloc":
+            _tracing.acquire()
+        self.started_at = timezone.now()
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.wall_time = time.perf_counter() - self.started
+        _current_recorder.reset(self.token)
+        if self.mode == "tracemalloc":
+            try:
+                self.snapshot = tracemalloc.take_snapshot()
+            finally:
+                _tracing.release()
+
+    def save(self, response):
+        profile = {
+            "id": next(_profile_ids),
+            "method": self.request.method,
+            "path": self.request.get_full_path(),
+            "status": response.status_code,
+            "started_at": self.started_at,
+            "wall_time": self.wall_time,
+            "queries": self.recorder.count,
+            "sql_time": self.recorder.time,
+            "callers": self.recorder.top_callers(),
+        }
+        if self.profiler is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(settings.PROFILING_TOP)
+            profile["cprofile"] = stream.getvalue()
+        if self.snapshot is not None:
+            profile["tracemalloc"] = [
+                str(stat)
+                for stat in self.snapshot.statistics("lineno")[: settings.PROFILING_TOP]
+            ]
+        profiles.append(profile)
+        response["X-Profile-Id"] = str(profile["id"])
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests with "X-Profile" header (1, cprofile or tracemalloc) when PROFILING_ENABLED:
+    wall time, number and time of SQL queries per calling function and optionally
+    cProfile stats or tracemalloc top allocations. Profiles are kept in ring buffer (see profiles)
+    Under ASGI requests stay async, cProfile sees only the thread of event loop then
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # instance is called as coroutine function by Django, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = request.headers.get("X-Profile")
+        if not settings.PROFILING_ENABLED or mode not in PROFILE_MODES:
+            return self.get_response(request)
+        with _Profile(request, mode) as profile:
+            response = self.get_response(request)
+        return profile.save(response)
+
+    async def __acall__(self, request):
+        mode = request.headers.get("X-Profile")
+        if not settings.PROFILING_ENABLED or mode not in PROFILE_MODES:
+            return await self.get_response(request)
+        with _Profile(request, mode) as profile:
+            response = await self.get_response(request)
+        return profile.save(response)
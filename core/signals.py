@@ -0,0 +1,138 @@
+import functools
+
+from django.conf import settings
+from django.contrib.auth.models import User as DjangoUser
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import metrics, profiling
+from core.busy_index import busy_index
+from core.models import Event, EventOccurrence, Invite, RRule, User
+from core.versions import bump_versions
+
+# fields of user which are shown in descriptions of events
+USER_DESCRIPTION_FIELDS = {"first_name", "last_name", "email"}
+
+
+def _related_user_ids(event_id):
+    event = Event.objects.filter(id=event_id).first()
+    return event.get_related_user_ids() if event is not None else []
+
+
+def _bump_event_versions(event_id, user_ids):
+    # event is shown in descriptions, invites and events of its related users
+    bump_versions("event", [event_id])
+    bump_versions("user", user_ids)
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    instance.rebuild_occurrences()
+    related_user_ids = instance.get_related_user_ids()
+    busy_index.invalidate(related_user_ids)
+    _bump_event_versions(instance.id, related_user_ids)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    # invites are deleted by cascade and invalidate their users themselves
+    busy_index.invalidate([instance.owner_id])
+    _bump_event_versions(instance.id, [instance.owner_id])
+
+
+@receiver(post_save, sender=RRule)
+def rrule_saved(sender, instance, **kwargs):
+    event = Event.objects.get(id=instance.event_id)
+    event.rebuild_occurrences()
+    related_user_ids = event.get_related_user_ids()
+    busy_index.invalidate(related_user_ids)
+    _bump_event_versions(event.id, related_user_ids)
+
+
+@receiver(post_delete, sender=RRule)
+def rrule_deleted(sender, instance, **kwargs):
+    # RRules are also deleted by cascade before their event, so event is not rebuilt here,
+    # just marked as not materialized (until next "extend_occurrences" run)
+    EventOccurrence.objects.filter(event_id=instance.event_id).delete()
+    Event.objects.filter(id=instance.event_id).update(occurrences_until=None)
+    related_user_ids = _related_user_ids(instance.event_id)
+    busy_index.invalidate(related_user_ids)
+    _bump_event_versions(instance.event_id, related_user_ids)
+
+
+@receiver(post_save, sender=Invite)
+def invite_saved(sender, instance, **kwargs):
+    instance.sync_occurrences()
+    busy_index.invalidate([instance.user_id])
+    # visibility of private event changes for all its related users
+    _bump_event_versions(instance.event_id, _related_user_ids(instance.event_id))
+
+
+@receiver(post_delete, sender=Invite)
+def invite_deleted(sender, instance, **kwargs):
+    EventOccurrence.objects.filter(
+        event_id=instance.event_id, user_id=instance.user_id
+    ).exclude(event__owner_id=instance.user_id).delete()
+    busy_index.invalidate([instance.user_id])
+    _bump_event_versions(
+        instance.event_id, _related_user_ids(instance.event_id) + [instance.user_id]
+    )
+
+
+# proxy model is sender of its own saves
+@receiver(post_save, sender=DjangoUser)
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # e.g. login updates only last_login, which isn't shown anywhere
+    if created or (update_fields and not USER_DESCRIPTION_FIELDS & set(update_fields)):
+        return
+    event_ids = list(
+        Event.objects.filter(owner_id=instance.id).values_list("id", flat=True)
+    )
+    event_ids += Invite.objects.filter(user_id=instance.id).values_list(
+        "event_id", flat=True
+    )
+    bump_versions("event", event_ids)
+    # user is shown in own invites
+    bump_versions("user", [instance.id])
+
+
+def _checked_cursor(connection, cursor, name=None):
+    # runs before every cursor of connection is created, but checks it once per request
+    if connection.health_check_needed:
+        connection.health_check_needed = False
+        if (
+            connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
+    return cursor(name)
+
+
+@receiver(request_started)
+def check_db_connections(sender, **kwargs):
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        # connection isn't opened yet or is used by transaction of the caller
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        # connection is checked when its first cursor is created, so requests
+        # which don't query database don't wait for a round trip to it
+        if "_cursor" not in vars(connection):
+            connection._cursor = functools.partial(
+                _checked_cursor, connection, connection._cursor
+            )
+        connection.health_check_needed = True
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    # wrappers stay on connection object of thread when database connection is reopened
+    for wrapper in (metrics.count_query, profiling.record_query):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
@@ -1,7 +1,43 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from core.models import Event, Invite, RRule, User
+from core import metrics, profiling
+from core.busy_index import BusyIndex, busy_index
+from core.common.cursor import encode_cursor
+from core.common.bitset_slots import np
+from core.description_cache import DescriptionCache
+from core.models import Event, EventOccurrence, Invite, RRule, User
+from core.views import response as response_module
 
 
 class ModelTests(TestCase):
@@ -65,11 +101,110 @@ class ModelTests(TestCase):
             ),
         )
 
+    def test_event_repeats_by_time_period(self):
+        event = Event.objects.all()[0]
+        instances = event.get_instances(
+            from_time=parse_datetime("2024-04-19T16:00:00Z"),
+            till_time=parse_datetime("2024-04-21T15:00:00Z"),
+        )
+        self.assertListEqual(
+            [
+                (
+                    parse_datetime("2024-04-19T15:00:00Z"),
+                    parse_datetime("2024-04-19T16:30:00Z"),
+                ),
+                (
+                    parse_datetime("2024-04-20T15:00:00Z"),
+                    parse_datetime("2024-04-20T16:30:00Z"),
+                ),
+                (
+                    parse_datetime("2024-04-21T15:00:00Z"),
+                    parse_datetime("2024-04-21T16:30:00Z"),
+                ),
+            ],
+            list(instances),
+        )
+
+        # period before the first repeat
+        instances = event.get_instances(
+            from_time=parse_datetime("2022-04-01T00:00:00Z"),
+            till_time=parse_datetime("2022-04-19T15:00:00Z"),
+        )
+        self.assertEqual(1, len(list(instances)))
+
+    def test_description_queries(self):
+        event = Event.objects.select_related("owner").all()[0]
+        for i in range(10):
+            guest = User.objects.create(first_name="Guest", username=f"guest{i}")
+            Invite.objects.create(
+                user_id=guest.id, event_id=event.id, status=Invite.Status.ACCEPTED
+            )
+        # RRules and invites joined with users
+        with self.assertNumQueries(2):
+            description = event.deep_description()
+        self.assertEqual(1, len(description["invites"]["PENDING"]))
+        self.assertEqual(10, len(description["invites"]["ACCEPTED"]))
+        with self.assertNumQueries(1):
+            event.hidden_description()
+
     def test_pending_invite(self):
         guest_user = User.objects.filter(email="guest@gmail.com")[0]
         pending = guest_user.get_invites_by_status(Invite.Status.PENDING)
         self.assertTrue(len(pending) == 1)
 
+    def test_events_by_time_period_queries(self):
+        user = User.objects.get(email="johndoe@gmail.com")
+        guest = User.objects.get(email="guest@gmail.com")
+        Invite.objects.filter(user_id=guest.id).update(status=Invite.Status.ACCEPTED)
+        # plain and recurring events, owned and accepted ones, and prefetch of RRules
+        with self.assertNumQueries(5):
+            self.assertEqual(1, len(guest.get_events_by_time_period()))
+
+        for i in range(10):
+            event = Event.objects.create(
+                title=f"Event {i}",
+                start=parse_datetime("2022-04-20T15:00:00Z"),
+                end=parse_datetime("2022-04-20T16:00:00Z"),
+                owner_id=user.id,
+            )
+            Invite.objects.create(
+                user_id=guest.id, event_id=event.id, status=Invite.Status.ACCEPTED
+            )
+        with self.assertNumQueries(5):
+            self.assertEqual(11, len(guest.get_events_by_time_period()))
+        with self.assertNumQueries(5):
+            self.assertEqual(11, len(user.get_events_by_time_period()))
+
+    def test_recurring_events_expansion_queries(self):
+        user = User.objects.get(email="johndoe@gmail.com")
+        start = parse_datetime("2022-05-01T10:00:00Z")
+        # bulk_create skips signals, so events are not materialized
+        events = Event.objects.bulk_create(
+            Event(
+                title=f"Event {i}",
+                start=start,
+                end=start + datetime.timedelta(minutes=30),
+                owner_id=user.id,
+                is_recurring=True,
+            )
+            for i in range(1000)
+        )
+        RRule.objects.bulk_create(
+            RRule.weekly(event_id=event.id, start=event.start) for event in events
+        )
+
+        my_events = user.get_events_by_time_period()
+        with self.assertNumQueries(0):
+            for event in my_events:
+                next(event.get_instances(from_time=start))
+
+        from_time = parse_datetime("2022-06-01T00:00:00Z")
+        till_time = parse_datetime("2022-06-08T00:00:00Z")
+        # occurrences, events split by kind and ownership, prefetch of RRules
+        with self.assertNumQueries(6):
+            slots = list(user.get_occupied_time_slots(from_time, till_time))
+        self.assertEqual(1000 + 7, len(slots))
+
     def test_user_events_by_period(self):
         # firstly when invite hasn't been accepted yet
         guest_user = User.objects.filter(email="guest@gmail.com")[0]
@@ -97,6 +232,39 @@ class ModelTests(TestCase):
         )
         self.assertTrue(len(instances) == 0)
 
+    def test_user_events_by_period_query(self):
+        user = User.objects.get(email="johndoe@gmail.com")
+        old_event = Event.objects.create(
+            title="Old event",
+            start=parse_datetime("2020-01-01T10:00:00Z"),
+            end=parse_datetime("2020-01-01T11:00:00Z"),
+            owner_id=user.id,
+        )
+        finished_event = Event.objects.create(
+            title="Finished recurring event",
+            start=parse_datetime("2020-01-01T10:00:00Z"),
+            end=parse_datetime("2020-01-01T11:00:00Z"),
+            owner_id=user.id,
+            is_recurring=True,
+        )
+        RRule.weekly(
+            event_id=finished_event.id,
+            start=finished_event.start,
+            end=parse_datetime("2021-01-01T00:00:00Z"),
+        ).save()
+
+        events = user.get_events_by_time_period(
+            from_time=parse_datetime("2019-12-31T00:00:00Z"),
+            till_time=parse_datetime("2020-02-01T00:00:00Z"),
+        )
+        self.assertSetEqual({old_event.id, finished_event.id}, {e.id for e in events})
+
+        events = user.get_events_by_time_period(
+            from_time=parse_datetime("2022-04-19T14:00:00Z"),
+            till_time=parse_datetime("2022-04-19T18:00:00Z"),
+        )
+        self.assertListEqual(["Test title"], [event.title for event in events])
+
     def test_user_occupied_time_slots(self):
         user = User.objects.get(email="johndoe@gmail.com")
         slots = user.get_occupied_time_slots()
@@ -110,6 +278,226 @@ class ModelTests(TestCase):
         )
 
 
+class OccurrencesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.guest = User.objects.create(
+            first_name="Guest", email="guest@gmail.com", username="guest"
+        )
+        self.now = timezone.now().replace(microsecond=0)
+        self.event = Event.objects.create(
+            title="Daily event",
+            start=self.now - datetime.timedelta(days=2),
+            end=self.now - datetime.timedelta(days=2) + datetime.timedelta(hours=1),
+            owner_id=self.user.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+
+    def test_materialized_on_create(self):
+        event = Event.objects.get(id=self.event.id)
+        occurrences = EventOccurrence.objects.filter(event_id=event.id)
+        self.assertEqual(
+            {self.user.id}, set(occurrences.values_list("user_id", flat=True))
+        )
+        self.assertEqual(event.start, occurrences.order_by("start")[0].start)
+        self.assertLess(
+            occurrences.order_by("-start")[0].start, event.occurrences_until
+        )
+
+    def test_invite_status_sync(self):
+        invite = Invite.objects.create(user_id=self.guest.id, event_id=self.event.id)
+        guest_occurrences = EventOccurrence.objects.filter(user_id=self.guest.id)
+        self.assertFalse(guest_occurrences.exists())
+
+        invite.status = Invite.Status.ACCEPTED
+        invite.save()
+        self.assertEqual(
+            EventOccurrence.objects.filter(user_id=self.user.id).count(),
+            guest_occurrences.count(),
+        )
+
+        invite.status = Invite.Status.REJECTED
+        invite.save()
+        self.assertFalse(guest_occurrences.exists())
+
+    @override_settings(OCCURRENCES_HORIZON=datetime.timedelta(days=1))
+    def test_read_beyond_horizon(self):
+        self.event.rebuild_occurrences()
+        from_time = self.now + datetime.timedelta(days=5)
+        till_time = self.now + datetime.timedelta(days=8)
+        instances = self.user.get_events_instances_by_time_period(from_time, till_time)
+        self.assertEqual(3, len(instances))
+
+        slots = self.user.get_occupied_time_slots(from_time=self.now)
+        starts = [next(slots)[0] for _ in range(5)]
+        self.assertListEqual(
+            [self.event.start + datetime.timedelta(days=i) for i in range(2, 7)],
+            starts,
+        )
+
+    def test_extend_occurrences_command(self):
+        Event.objects.filter(id=self.event.id).update(occurrences_until=None)
+        EventOccurrence.objects.all().delete()
+        call_command("extend_occurrences", horizon_days=2, stdout=io.StringIO())
+
+        event = Event.objects.get(id=self.event.id)
+        self.assertEqual(
+            # two past days, today and two days of horizon
+            5,
+            EventOccurrence.objects.filter(event_id=event.id).count(),
+        )
+
+    def test_rrule_delete(self):
+        RRule.objects.filter(event_id=self.event.id).delete()
+        self.assertFalse(EventOccurrence.objects.exists())
+        self.assertIsNone(Event.objects.get(id=self.event.id).occurrences_until)
+
+
+class BusyIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.now = timezone.now().replace(microsecond=0)
+        self.event = Event.objects.create(
+            title="Daily event",
+            start=self.now + datetime.timedelta(hours=1),
+            end=self.now + datetime.timedelta(hours=2),
+            owner_id=self.user.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+        self.index = BusyIndex(
+            max_users=2,
+            horizon=datetime.timedelta(days=2),
+            ttl=datetime.timedelta(minutes=5),
+        )
+
+    def test_cached_slots(self):
+        slots = self.index.get_occupied_time_slots(self.user, self.now)
+        first = [next(slots) for _ in range(2)]
+        with self.assertNumQueries(0):
+            slots = self.index.get_occupied_time_slots(self.user, self.now)
+            self.assertListEqual(first, [next(slots) for _ in range(2)])
+
+        # after horizon slots are continued from database
+        slots = self.index.get_occupied_time_slots(self.user, self.now)
+        starts = [next(slots)[0] for _ in range(5)]
+        self.assertListEqual(
+            [self.event.start + datetime.timedelta(days=i) for i in range(5)], starts
+        )
+
+    @override_settings(FREE_SLOT_MAX_EXAMINED=2)
+    def test_build_is_bounded_by_examined_limit(self):
+        # entry stops after two slots, the rest is continued from database
+        slots = self.index.get_occupied_time_slots(self.user, self.now)
+        starts = [next(slots)[0] for _ in range(5)]
+        self.assertListEqual(
+            [self.event.start + datetime.timedelta(days=i) for i in range(5)], starts
+        )
+
+    def test_lru_eviction(self):
+        users = [self.user] + [
+            User.objects.create(first_name="Guest", username=f"guest{i}")
+            for i in range(2)
+        ]
+        for user in users:
+            next(self.index.get_occupied_time_slots(user, self.now), None)
+        self.assertEqual(2, len(self.index))
+        with self.assertNumQueries(0):
+            next(self.index.get_occupied_time_slots(users[-1], self.now), None)
+
+    def test_invalidation_by_signals(self):
+        guest = User.objects.create(first_name="Guest", username="guest")
+        slots = busy_index.get_occupied_time_slots(guest, self.now)
+        self.assertListEqual([], list(itertools.islice(slots, 1)))
+
+        Invite.objects.create(
+            user_id=guest.id, event_id=self.event.id, status=Invite.Status.ACCEPTED
+        )
+        slots = busy_index.get_occupied_time_slots(guest, self.now)
+        self.assertTupleEqual((self.event.start, self.event.end), next(slots))
+
+
+class DescriptionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.guest = User.objects.create(
+            first_name="Guest", email="guest@gmail.com", username="guest"
+        )
+        self.event = Event.objects.create(
+            title="Event example",
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=self.owner.id,
+            is_private=True,
+        )
+        self.cache = DescriptionCache(alias="default", timeout=60)
+
+    def test_cached_description(self):
+        description = self.cache.get_description(self.event.id, self.owner.id)
+        self.assertDictEqual(self.event.deep_description(), description)
+        with self.assertNumQueries(0):
+            self.assertDictEqual(
+                description, self.cache.get_description(self.event.id, self.owner.id)
+            )
+        self.assertDictEqual(
+            {"hits": 1, "misses": 1, "hit_ratio": 0.5}, self.cache.stats()
+        )
+
+        # private event is hidden from not related users
+        self.assertDictEqual(
+            self.event.hidden_description(),
+            self.cache.get_description(self.event.id, self.guest.id),
+        )
+        self.assertIsNone(self.cache.get_description(self.event.id + 1, self.owner.id))
+
+    def test_invalidation_by_signals(self):
+        self.cache.get_description(self.event.id, self.guest.id)
+        invite = Invite.objects.create(user_id=self.guest.id, event_id=self.event.id)
+        description = self.cache.get_description(self.event.id, self.guest.id)
+        self.assertListEqual(
+            ["Guest (guest@gmail.com)"], description["invites"]["PENDING"]
+        )
+
+        invite.status = Invite.Status.ACCEPTED
+        invite.save()
+        description = self.cache.get_description(self.event.id, self.guest.id)
+        self.assertListEqual(
+            ["Guest (guest@gmail.com)"], description["invites"]["ACCEPTED"]
+        )
+
+        self.event.is_recurring = True
+        self.event.save()
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+        description = self.cache.get_description(self.event.id, self.guest.id)
+        self.assertEqual(1, len(description["repeats"]))
+
+        self.guest.first_name = "Renamed"
+        self.guest.save()
+        description = self.cache.get_description(self.event.id, self.guest.id)
+        self.assertListEqual(
+            ["Renamed (guest@gmail.com)"], description["invites"]["ACCEPTED"]
+        )
+
+        # login changes only last_login, which doesn't invalidate descriptions
+        self.guest.set_password("mysecretpassword")
+        self.guest.save()
+        self.cache.get_description(self.event.id, self.guest.id)
+        self.client.login(username="guest", password="mysecretpassword")
+        with self.assertNumQueries(0):
+            self.cache.get_description(self.event.id, self.guest.id)
+
+        self.event.delete()
+        self.assertIsNone(self.cache.get_description(self.event.id, self.guest.id))
+
+
 class CreateViewsTests(TestCase):
     def test_create_user(self):
         response = self.client.post(
@@ -141,6 +529,20 @@ class CreateViewsTests(TestCase):
         )
         self.assertEqual(400, response.status_code)
 
+        # username is taken
+        response = self.client.post(
+            "/api/create/user",
+            content_type="application/json",
+            data={
+                "first_name": "John",
+                "last_name": "Doe",
+                "email": "other@gmail.com",
+                "username": "johndoe",
+                "password": "mysecretpassword",
+            },
+        )
+        self.assertEqual(400, response.status_code)
+
     def test_create_event(self):
         event_descr = {
             "title": "Example event",
@@ -188,6 +590,133 @@ class CreateViewsTests(TestCase):
         self.assertTrue(len(events) > 0)
         event = events[0]
         self.assertEqual("Example event", event.title)
+        self.assertEqual(1, RRule.objects.filter(event_id=event.id).count())
+        self.assertEqual(
+            [guest.id],
+            list(
+                Invite.objects.filter(event_id=event.id).values_list(
+                    "user_id", flat=True
+                )
+            ),
+        )
+        self.assertTrue(EventOccurrence.objects.filter(event_id=event.id).exists())
+
+    def test_import_events(self):
+        user = User(first_name="John", email="johndoe@gmail.com", username="johndoe")
+        user.set_password("mysecretpassword")
+        user.save()
+        guest = User.objects.create(
+            first_name="Guest", email="guest@gmail.com", username="guest"
+        )
+        lines = [
+            {
+                "title": "Daily event",
+                "start": "2022-04-20T08:00:00Z",
+                "end": "2022-04-20T10:00:00Z",
+                "is_recurring": True,
+                "repeats": ["daily", "weekly"],
+                "invited_emails": ["guest@gmail.com", "unknown@gmail.com"],
+            },
+            {
+                "title": "Plain event",
+                "start": "2022-04-21T08:00:00Z",
+                "end": "2022-04-21T10:00:00Z",
+            },
+            {"title": "Broken event", "start": "2022-04-21T08:00:00Z"},
+            {
+                "title": "Private event",
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+                "is_private": True,
+            },
+            {
+                "title": "Long" * 100,
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+            },
+            {
+                "title": "Event with long description",
+                "description": "a" * 1025,
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+            },
+            {
+                "title": "Event with number of repeats",
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+                "is_recurring": True,
+                "repeats": 5,
+            },
+            {
+                "title": "Event with nested repeats",
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+                "is_recurring": True,
+                "repeats": [["daily"]],
+            },
+            {
+                "title": "Event with object email",
+                "start": "2022-04-22T08:00:00Z",
+                "end": "2022-04-22T10:00:00Z",
+                "invited_emails": [{"a": 1}],
+            },
+        ]
+        body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n\n"
+
+        self.client.post(
+            "/accounts/login",
+            content_type="application/json",
+            data={"username": "johndoe", "password": "mysecretpassword"},
+        )
+        response = self.client.post(
+            "/api/create/events?batch_size=2",
+            content_type="application/x-ndjson",
+            data=body,
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertDictEqual(
+            {
+                "created": 3,
+                "errors": [
+                    {"line": 3, "error": "Your POST query has no key 'end'"},
+                    {
+                        "line": 5,
+                        "error": "title should be at most 100 characters long",
+                    },
+                    {
+                        "line": 6,
+                        "error": "description should be at most 1024 characters long",
+                    },
+                    {"line": 7, "error": "repeats should be list of strings"},
+                    {"line": 8, "error": "repeats should be list of strings"},
+                    {"line": 9, "error": "invited_emails should be list of strings"},
+                    {"line": 10, "error": "Line is not valid JSON"},
+                ],
+            },
+            response.json(),
+        )
+
+        event = Event.objects.get(title="Daily event")
+        self.assertEqual(2, RRule.objects.filter(event_id=event.id).count())
+        self.assertListEqual(
+            [guest.id],
+            list(
+                Invite.objects.filter(event_id=event.id).values_list(
+                    "user_id", flat=True
+                )
+            ),
+        )
+        self.assertTrue(Event.objects.get(title="Private event").is_private)
+        # imported events are materialized like created ones
+        self.assertEqual(
+            1, EventOccurrence.objects.filter(event__title="Plain event").count()
+        )
+        instances = user.get_events_instances_by_time_period(
+            parse_datetime("2022-04-20T00:00:00Z"),
+            parse_datetime("2022-04-21T23:00:00Z"),
+        )
+        # two daily, one weekly and the plain event
+        self.assertEqual(4, len(instances))
 
 
 class InfoViewsTests(TestCase):
@@ -314,6 +843,69 @@ class InfoViewsTests(TestCase):
         self.assertEqual(200, response.status_code)
         self.assertDictEqual({"invites": []}, response.json())
 
+    def test_info_user_invites_pages(self):
+        owner = User.objects.create(email="johndoe@gmail.com", username="johndoe")
+        guest = User(first_name="Guest", email="guest@gmail.com", username="guest")
+        guest.set_password("mysecretpassword")
+        guest.save()
+        invites = []
+        for i in range(25):
+            event = Event.objects.create(
+                title=f"Event {i}",
+                start=parse_datetime("2022-04-19T15:00:00Z"),
+                end=parse_datetime("2022-04-19T16:30:00Z"),
+                owner_id=owner.id,
+            )
+            status = Invite.Status.ACCEPTED if i % 5 == 0 else Invite.Status.PENDING
+            invites.append(
+                Invite.objects.create(
+                    user_id=guest.id, event_id=event.id, status=status
+                )
+            )
+        self.client.post(
+            "/accounts/login",
+            content_type="application/json",
+            data={"username": "guest", "password": "mysecretpassword"},
+        )
+
+        def get_all_pages(url, limit):
+            pages = []
+            response = self.client.get(f"{url}limit={limit}")
+            while True:
+                self.assertEqual(200, response.status_code)
+                pages.append(response.json()["invites"])
+                if "next_cursor" not in response.json():
+                    return pages
+                response = self.client.get(
+                    f"{url}limit={limit}&cursor={response.json()['next_cursor']}"
+                )
+
+        pages = get_all_pages("/api/info/invites?", 10)
+        self.assertListEqual([10, 10, 5], [len(page) for page in pages])
+        self.assertListEqual(
+            [str(invite) for invite in invites], list(itertools.chain(*pages))
+        )
+        pages = get_all_pages("/api/info/invites?status=ACCEPTED&", 2)
+        self.assertListEqual(
+            [str(invite) for invite in invites[::5]], list(itertools.chain(*pages))
+        )
+
+        # number of queries doesn't depend on page size
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get("/api/info/invites?limit=1")
+        with CaptureQueriesContext(connection) as large_page:
+            self.client.get("/api/info/invites?limit=25")
+        self.assertEqual(len(small_page), len(large_page))
+
+        self.assertEqual(400, self.client.get("/api/info/invites?limit=0").status_code)
+        # unicode digit which isn't accepted by int
+        self.assertEqual(
+            400, self.client.get("/api/info/invites?limit=%C2%B2").status_code
+        )
+        self.assertEqual(
+            400, self.client.get("/api/info/invites?cursor=abc").status_code
+        )
+
     def test_info_user_events(self):
         response = self.client.get("/api/info/user/1/events")
         self.assertEqual(400, response.status_code)
@@ -353,6 +945,84 @@ class InfoViewsTests(TestCase):
             response.json(),
         )
 
+    def test_info_user_events_pages(self):
+        user = User.objects.create(email="johndoe@gmail.com", username="johndoe")
+        event = Event.objects.create(
+            title="Event example",
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=user.id,
+            is_recurring=True,
+        )
+        # two rrules produce equal instances which can be split between pages
+        RRule.daily(event_id=event.id, start=event.start).save()
+        RRule.daily(event_id=event.id, start=event.start).save()
+        Event.objects.create(
+            title="Other event",
+            start=parse_datetime("2022-04-20T09:00:00Z"),
+            end=parse_datetime("2022-04-20T10:00:00Z"),
+            owner_id=user.id,
+        )
+        url = f"/api/info/user/{user.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+
+        all_events = self.client.get(url).json()["events"]
+        self.assertEqual(11, len(all_events))
+        self.assertEqual(sorted(all_events), all_events)
+
+        for limit in (1, 2, 3, 11, 20):
+            paged_events = []
+            response = self.client.get(f"{url}&limit={limit}").json()
+            while True:
+                self.assertLessEqual(len(response["events"]), limit)
+                paged_events.extend(response["events"])
+                if "next_cursor" not in response:
+                    break
+                response = self.client.get(
+                    f"{url}&limit={limit}&cursor={response['next_cursor']}"
+                ).json()
+            self.assertListEqual(all_events, paged_events)
+
+        response = self.client.get(f"{url}&limit=4&stream=1")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertListEqual(all_events[:4], data["events"])
+        self.assertIn("next_cursor", data)
+
+        self.assertEqual(400, self.client.get(f"{url}&limit=0").status_code)
+        self.assertEqual(400, self.client.get(f"{url}&limit=x").status_code)
+        # unicode digit which isn't accepted by int
+        self.assertEqual(400, self.client.get(f"{url}&limit=%C2%B2").status_code)
+        self.assertEqual(400, self.client.get(f"{url}&cursor=abc").status_code)
+        # cursor which isn't list
+        cursor = encode_cursor(5)
+        self.assertEqual(400, self.client.get(f"{url}&cursor={cursor}").status_code)
+        # cursor with naive datetimes
+        cursor = encode_cursor(["2022-01-05T00:00:00", "2022-01-05T01:00:00", 1, 0])
+        self.assertEqual(400, self.client.get(f"{url}&cursor={cursor}").status_code)
+
+    def test_info_user_events_page_inside_equal_keys(self):
+        user = User.objects.create(email="johndoe@gmail.com", username="johndoe")
+        start = parse_datetime("2022-04-19T15:00:00Z")
+        end = parse_datetime("2022-04-19T16:30:00Z")
+        Event.objects.create(title="Plain", start=start, end=end, owner_id=user.id)
+        event = Event.objects.create(
+            title="Recurring", start=start, end=end, owner_id=user.id, is_recurring=True
+        )
+        # the first instances of both rrules have the same key
+        RRule.daily(event_id=event.id, start=start).save()
+        RRule.weekly(event_id=event.id, start=start).save()
+        url = f"/api/info/user/{user.id}/events?from=2022-04-19T00:00:00&till=2022-04-19T23:00:00"
+
+        all_events = self.client.get(url).json()["events"]
+        self.assertEqual(3, len(all_events))
+        # the first page ends between instances with equal keys,
+        # and the instance of plain event which precedes them isn't counted by cursor
+        first = self.client.get(f"{url}&limit=2").json()
+        second = self.client.get(f"{url}&limit=2&cursor={first['next_cursor']}").json()
+        self.assertListEqual(all_events, first["events"] + second["events"])
+        self.assertNotIn("next_cursor", second)
+
 
 class UpdateViewsTests(TestCase):
     def test_update_invite(self):
@@ -388,6 +1058,10 @@ class UpdateViewsTests(TestCase):
 
 
 class TimetableViewsTests(TestCase):
+    def setUp(self):
+        # entries of in-process busy index outlive rolled back data of previous tests
+        busy_index.clear()
+
     def test_free_time_slot(self):
         user = User(
             first_name="John",
@@ -401,10 +1075,11 @@ class TimetableViewsTests(TestCase):
         guest.set_password("mysecretpassword")
         guest.save()
 
+        now = timezone.now().replace(microsecond=0)
         event = Event.objects.create(
             title="Event example",
-            start=parse_datetime("2022-04-19T15:00:00Z"),
-            end=parse_datetime("2022-04-19T16:30:00Z"),
+            start=now + datetime.timedelta(minutes=10),
+            end=now + datetime.timedelta(hours=2),
             owner_id=user.id,
         )
         Invite.objects.create(
@@ -417,7 +1092,849 @@ class TimetableViewsTests(TestCase):
             f"/api/timetable/free_time_slot?user_ids={user.id},{guest.id}&duration=30:00"
         )
         self.assertEqual(200, response.status_code)
+        self.assertEqual(event.end, parse_datetime(response.json()["start"]))
+        self.assertEqual(
+            event.end + datetime.timedelta(minutes=30),
+            parse_datetime(response.json()["end"]),
+        )
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_free_time_slot_bitset_engine(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        now = timezone.now().replace(microsecond=0)
+        event = Event.objects.create(
+            title="Event example",
+            start=now + datetime.timedelta(minutes=10),
+            end=now + datetime.timedelta(hours=2),
+            owner_id=user.id,
+        )
+        url = f"/api/timetable/free_time_slot?user_ids={user.id}&duration=1:00:00"
+        exact = self.client.get(url).json()
+        response = self.client.get(url + "&engine=bitset")
+        self.assertEqual(200, response.status_code)
+        start = parse_datetime(response.json()["start"])
+        self.assertLessEqual(parse_datetime(exact["start"]), start)
+        self.assertLess(start, event.end + settings.FREE_SLOT_BITSET_RESOLUTION)
+
+        response = self.client.get(url + "&engine=unknown")
+        self.assertEqual(400, response.status_code)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_free_time_slot_bitset_engine_limit(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        now = timezone.now().replace(microsecond=0)
+        # endless event every 30 minutes leaves no free hour
+        event = Event.objects.create(
+            title="Every half an hour",
+            start=now + datetime.timedelta(minutes=10),
+            end=now + datetime.timedelta(minutes=30),
+            owner_id=user.id,
+            is_recurring=True,
+        )
+        RRule.objects.create(
+            event_id=event.id,
+            start=event.start,
+            interval=datetime.timedelta(minutes=30),
+        )
+        url = f"/api/timetable/free_time_slot?user_ids={user.id}&duration=1:00:00&engine=bitset"
+        with override_settings(FREE_SLOT_MAX_EXAMINED=100):
+            busy_index.clear()
+            response = self.client.get(url)
+            self.assertEqual(200, response.status_code)
+            self.assertDictEqual(
+                {"start": None, "end": None, "limit_exceeded": True}, response.json()
+            )
+            response = self.client.get(f"{url}&count=3")
+            self.assertDictEqual({"slots": [], "limit_exceeded": True}, response.json())
+            # heap engine isn't searched after the limit is exceeded by bitset one
+            response = self.client.get(f"{url}&count=3&horizon=P40D")
+            self.assertDictEqual({"slots": [], "limit_exceeded": True}, response.json())
+
+    def test_free_time_slot_overlapping_repeats(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.client.force_login(user)
+        now = timezone.now().replace(microsecond=0)
+        # event is longer than interval of its repeats, so they are merged into one endless slot
+        response = self.client.post(
+            "/api/create/event",
+            content_type="application/json",
+            data={
+                "title": "Two days long",
+                "start": (now - datetime.timedelta(hours=1)).isoformat(),
+                "end": (now + datetime.timedelta(hours=47)).isoformat(),
+                "is_recurring": True,
+                "repeats": ["daily"],
+            },
+        )
+        self.assertEqual(200, response.status_code)
+        busy_index.clear()
+
+        url = f"/api/timetable/free_time_slot?user_ids={user.id}&duration=1:00:00"
+        engines = ["heap", "bitset"] if np is not None else ["heap"]
+        for params in ("horizon=P1D", "horizon=P40D", "count=2"):
+            for engine in engines:
+                response = self.client.get(f"{url}&engine={engine}&{params}")
+                self.assertEqual(200, response.status_code, (engine, params))
+                self.assertIn(
+                    response.json(),
+                    (
+                        {"start": None, "end": None, "limit_exceeded": False},
+                        {"slots": [], "limit_exceeded": False},
+                    ),
+                    (engine, params),
+                )
+
+    def test_free_time_slot_ignores_past(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        # big gap between two past events must not be returned
+        for start in ("2022-04-19T15:00:00Z", "2022-04-25T15:00:00Z"):
+            Event.objects.create(
+                title="Past event",
+                start=parse_datetime(start),
+                end=parse_datetime(start) + datetime.timedelta(hours=1),
+                owner_id=user.id,
+            )
+
+        before = timezone.now()
+        response = self.client.get(
+            f"/api/timetable/free_time_slot?user_ids={user.id}&duration=1:00:00"
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertLessEqual(
+            before.replace(microsecond=0), parse_datetime(response.json()["start"])
+        )
+
+    def test_free_time_slot_horizon_and_count(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        now = timezone.now().replace(microsecond=0)
+        # endless daily event leaves one hour a day free
+        event = Event.objects.create(
+            title="Almost all day",
+            start=now + datetime.timedelta(minutes=90),
+            end=now + datetime.timedelta(minutes=90, hours=23),
+            owner_id=user.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=event.id, start=event.start).save()
+        url = f"/api/timetable/free_time_slot?user_ids={user.id}"
+
+        response = self.client.get(f"{url}&duration=2:00:00&horizon=P7D")
+        self.assertEqual(200, response.status_code)
         self.assertDictEqual(
-            {"start": "2022-04-19T16:30:00Z", "end": "2022-04-19T17:00:00Z"},
-            response.json(),
+            {"start": None, "end": None, "limit_exceeded": False}, response.json()
+        )
+        response = self.client.get(f"{url}&duration=2:00:00&count=3")
+        self.assertDictEqual({"slots": [], "limit_exceeded": False}, response.json())
+        # search without free slots is bounded by number of examined slots
+        with override_settings(FREE_SLOT_MAX_EXAMINED=100):
+            busy_index.clear()
+            response = self.client.get(f"{url}&duration=2:00:00&count=3")
+            self.assertDictEqual({"slots": [], "limit_exceeded": True}, response.json())
+
+        response = self.client.get(f"{url}&duration=30:00&count=5&horizon=P3D")
+        slots = [
+            (parse_datetime(slot["start"]), parse_datetime(slot["end"]))
+            for slot in response.json()["slots"]
+        ]
+        half_hour = datetime.timedelta(minutes=30)
+        next_end = event.end + datetime.timedelta(days=1)
+        # two slots before the first repeat, then free hours between repeats
+        self.assertLessEqual(slots[1][1], event.start)
+        self.assertListEqual(
+            [
+                (event.end, event.end + half_hour),
+                (event.end + half_hour, event.end + 2 * half_hour),
+                (next_end, next_end + half_hour),
+            ],
+            slots[2:],
+        )
+
+        for params in (
+            "horizon=P1000D",
+            "horizon=abc",
+            "count=0",
+            "count=abc",
+            # unicode digit which isn't accepted by int
+            "count=%C2%B2",
+        ):
+            response = self.client.get(f"{url}&duration=30:00&{params}")
+            self.assertEqual(400, response.status_code, params)
+
+    def test_free_time_slots_batch(self):
+        user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        guest = User.objects.create(
+            first_name="Guest", email="guest@gmail.com", username="guest"
+        )
+        now = timezone.now().replace(microsecond=0)
+        event = Event.objects.create(
+            title="Event example",
+            start=now + datetime.timedelta(minutes=10),
+            end=now + datetime.timedelta(hours=2),
+            owner_id=guest.id,
+        )
+
+        response = self.client.post(
+            "/api/timetable/free_time_slots",
+            content_type="application/json",
+            data={
+                "queries": [
+                    {"user_ids": [user.id, guest.id], "duration": "30:00", "count": 2},
+                    {"user_ids": [guest.id, user.id], "duration": "1:00:00"},
+                    {"user_ids": [user.id], "duration": "5:00"},
+                    {"user_ids": [user.id], "duration": "30:00", "horizon": "5:00"},
+                ]
+            },
+        )
+        self.assertEqual(200, response.status_code)
+        results = [
+            [
+                (parse_datetime(slot["start"]), parse_datetime(slot["end"]))
+                for slot in slots
+            ]
+            for slots in response.json()["results"]
+        ]
+        half_hour = datetime.timedelta(minutes=30)
+        self.assertListEqual(
+            [
+                (event.end, event.end + half_hour),
+                (event.end + half_hour, event.end + 2 * half_hour),
+            ],
+            results[0],
+        )
+        self.assertListEqual([(event.end, event.end + 2 * half_hour)], results[1])
+        self.assertEqual(1, len(results[2]))
+        self.assertLess(results[2][0][0], event.start)
+        # slot doesn't fit into horizon
+        self.assertListEqual([], results[3])
+        self.assertListEqual([False] * 4, response.json()["limit_exceeded"])
+
+        # search is stopped in the first query, so the second one isn't searched
+        busy = User.objects.create(
+            first_name="Busy", email="busy@gmail.com", username="busy"
+        )
+        busy_event = Event.objects.create(
+            title="Every half an hour",
+            start=now + datetime.timedelta(minutes=10),
+            end=now + datetime.timedelta(minutes=30),
+            owner_id=busy.id,
+            is_recurring=True,
+        )
+        RRule.objects.create(
+            event_id=busy_event.id,
+            start=busy_event.start,
+            interval=datetime.timedelta(minutes=30),
+        )
+        with override_settings(FREE_SLOT_MAX_EXAMINED=100):
+            busy_index.clear()
+            response = self.client.post(
+                "/api/timetable/free_time_slots",
+                content_type="application/json",
+                data={
+                    "queries": [
+                        {"user_ids": [busy.id], "duration": "1:00:00"},
+                        {"user_ids": [user.id], "duration": "5:00"},
+                    ]
+                },
+            )
+        self.assertDictEqual(
+            {"results": [[], []], "limit_exceeded": [True, True]}, response.json()
+        )
+
+        # not existing user
+        response = self.client.post(
+            "/api/timetable/free_time_slots",
+            content_type="application/json",
+            data={"queries": [{"user_ids": [user.id + 100], "duration": "5:00"}]},
+        )
+        self.assertEqual(400, response.status_code)
+
+
+class ResponseTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.event = Event.objects.create(
+            title="Événement",
+            description="x" * 2000,
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=self.user.id,
+        )
+
+    def test_compact_json(self):
+        response = self.client.get(f"/api/info/event/{self.event.id}")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/json", response["Content-Type"])
+        self.assertNotIn(b"\n", response.content)
+        self.assertEqual(
+            self.event.deep_description()["title"], response.json()["title"]
+        )
+
+        with override_settings(API_JSON_INDENT=3):
+            response = self.client.get(f"/api/info/event/{self.event.id}")
+        self.assertIn(b"\n   ", response.content)
+
+    def test_encoders_are_interchangeable(self):
+        data = {"start": self.event.start, "title": self.event.title, "ids": [1, 2]}
+        encoded = response_module.encode_json(data)
+        self.assertEqual(b'{"start":"2022-04-19T15:00:00Z"', encoded[:31])
+        with mock.patch.object(response_module, "orjson", None):
+            self.assertEqual(encoded, response_module.encode_json(data))
+
+    def test_gzip(self):
+        url = f"/api/info/event/{self.event.id}"
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertDictEqual(
+            self.client.get(url).json(), json.loads(gzip.decompress(response.content))
         )
+
+        # small bodies are not compressed
+        response = self.client.get(
+            f"/api/info/user/{self.user.id}", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @unittest.skipIf(response_module.msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        url = f"/api/info/event/{self.event.id}"
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual("application/msgpack", response["Content-Type"])
+        self.assertDictEqual(
+            self.client.get(url).json(),
+            response_module.msgpack.unpackb(response.content),
+        )
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.guest = User(first_name="Guest", email="guest@gmail.com", username="guest")
+        self.guest.set_password("mysecretpassword")
+        self.guest.save()
+        self.event = Event.objects.create(
+            title="Event example",
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=self.owner.id,
+        )
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        return etag
+
+    def test_info_event(self):
+        url = f"/api/info/event/{self.event.id}"
+        etag = self.assertNotModified(url)
+        # nor description nor anything else is loaded from database
+        with self.assertNumQueries(0):
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        Invite.objects.create(user_id=self.guest.id, event_id=self.event.id)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertListEqual(
+            ["Guest (guest@gmail.com)"], response.json()["invites"]["PENDING"]
+        )
+
+    def test_info_user_invites(self):
+        self.client.login(username="guest", password="mysecretpassword")
+        url = "/api/info/invites"
+        Invite.objects.create(user_id=self.guest.id, event_id=self.event.id)
+        etag = self.assertNotModified(url)
+
+        self.event.title = "Renamed event"
+        self.event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertIn("event=Renamed event", response.json()["invites"][0])
+
+    def test_info_user_invites_after_create_event(self):
+        self.client.login(username="guest", password="mysecretpassword")
+        url = "/api/info/invites"
+        etag = self.assertNotModified(url)
+
+        owner_client = Client()
+        owner_client.force_login(self.owner)
+        response = owner_client.post(
+            "/api/create/event",
+            content_type="application/json",
+            data={
+                "title": "New event",
+                "start": "2022-04-20T15:00:00Z",
+                "end": "2022-04-20T16:00:00Z",
+                "invited_emails": ["guest@gmail.com"],
+            },
+        )
+        self.assertEqual(200, response.status_code)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertIn("event=New event", response.json()["invites"][0])
+
+    def test_info_user_events_after_import(self):
+        url = f"/api/info/user/{self.owner.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+        etag = self.assertNotModified(url)
+
+        self.client.force_login(self.owner)
+        line = {
+            "title": "Imported event",
+            "start": "2022-04-20T15:00:00Z",
+            "end": "2022-04-20T16:00:00Z",
+        }
+        response = self.client.post(
+            "/api/create/events",
+            content_type="application/x-ndjson",
+            data=json.dumps(line),
+        )
+        self.assertEqual(1, response.json()["created"])
+        self.client.logout()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, len(response.json()["events"]))
+
+    def test_info_user_events(self):
+        url = f"/api/info/user/{self.owner.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+        etag = self.assertNotModified(url)
+
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+        self.assertNotEqual(etag, self.assertNotModified(url))
+
+        # the same resource in other representation has other ETag
+        self.assertNotEqual(
+            self.client.get(url)["ETag"],
+            self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")["ETag"],
+        )
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profiling.profiles.clear()
+        self.owner = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.staff = User.objects.create(
+            first_name="Admin", email="admin@gmail.com", username="admin", is_staff=True
+        )
+        event = Event.objects.create(
+            title="Event example",
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=self.owner.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=event.id, start=event.start).save()
+        self.url = f"/api/info/user/{self.owner.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+
+    def get_profile(self, profile_id):
+        self.client.force_login(self.staff)
+        response = self.client.get(f"/api/debug/profiles?id={profile_id}")
+        self.assertEqual(200, response.status_code)
+        return response.json()["profile"]
+
+    def test_requests_are_profiled_on_demand(self):
+        self.assertNotIn("X-Profile-Id", self.client.get(self.url))
+        with override_settings(PROFILING_ENABLED=False):
+            self.assertNotIn(
+                "X-Profile-Id", self.client.get(self.url, HTTP_X_PROFILE="1")
+            )
+
+        response = self.client.get(self.url, HTTP_X_PROFILE="1")
+        profile = self.get_profile(response["X-Profile-Id"])
+        self.assertEqual(self.url, profile["path"])
+        self.assertEqual(200, profile["status"])
+        self.assertGreater(profile["queries"], 0)
+        self.assertEqual(
+            profile["queries"], sum(caller["queries"] for caller in profile["callers"])
+        )
+        # queries are attributed to functions of models, or views which run them
+        callers = [caller["caller"] for caller in profile["callers"]]
+        self.assertIn("core/models.py:get_events_by_time_period", callers)
+        self.assertIn("core/views/info_views.py:exist_user", callers)
+        self.assertNotIn("cprofile", profile)
+        self.assertNotIn("tracemalloc", profile)
+
+    def test_cprofile_and_tracemalloc(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE="cprofile")
+        profile = self.get_profile(response["X-Profile-Id"])
+        self.assertIn("function calls", profile["cprofile"])
+
+        response = self.client.get(self.url, HTTP_X_PROFILE="tracemalloc")
+        profile = self.get_profile(response["X-Profile-Id"])
+        self.assertTrue(profile["tracemalloc"])
+
+    def test_overlapping_tracemalloc_profiles(self):
+        request = RequestFactory().get(self.url)
+        first = profiling._Profile(request, "tracemalloc")
+        second = profiling._Profile(request, "tracemalloc")
+        first.__enter__()
+        second.__enter__()
+        # the first request ends while the second one is still traced
+        first.__exit__(None, None, None)
+        self.assertTrue(tracemalloc.is_tracing())
+        second.__exit__(None, None, None)
+        self.assertIsNotNone(second.snapshot)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_profiles_are_shown_to_staff_only(self):
+        for _ in range(3):
+            self.client.get(self.url, HTTP_X_PROFILE="1")
+        self.assertEqual(403, self.client.get("/api/debug/profiles").status_code)
+        self.client.force_login(self.owner)
+        self.assertEqual(403, self.client.get("/api/debug/profiles").status_code)
+
+        self.client.force_login(self.staff)
+        response = self.client.get("/api/debug/profiles")
+        ids = [profile["id"] for profile in response.json()["profiles"]]
+        # newest first
+        self.assertEqual(3, len(ids))
+        self.assertListEqual(sorted(ids, reverse=True), ids)
+        self.assertEqual(400, self.client.get("/api/debug/profiles?id=0").status_code)
+        self.assertEqual(
+            400, self.client.get("/api/debug/profiles?id=%C2%B2").status_code
+        )
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        self.owner = User.objects.create(
+            first_name="John", email="johndoe@gmail.com", username="johndoe"
+        )
+        self.event = Event.objects.create(
+            title="Event example",
+            start=parse_datetime("2022-04-19T15:00:00Z"),
+            end=parse_datetime("2022-04-19T16:30:00Z"),
+            owner_id=self.owner.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+        # occurrences are expanded from RRule instead of materialized ones
+        EventOccurrence.objects.all().delete()
+        Event.objects.update(occurrences_until=None)
+
+    def get_metrics(self):
+        with override_settings(METRICS_DIR=self.metrics_dir):
+            response = self.client.get("/api/metrics")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def get_sample(self, text, name, **labels):
+        formatted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+        if formatted:
+            name = f"{name}{{{formatted}}}"
+        match = re.search(rf"^{re.escape(name)} (\S+)$", text, re.MULTILINE)
+        return float(match.group(1)) if match else None
+
+    def test_request_metrics(self):
+        route = "api/info/user/<int:user_id>/events"
+        url = f"/api/info/user/{self.owner.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+        before = self.get_metrics()
+        self.client.get(url)
+        self.client.get(f"/api/info/event/{self.event.id}")
+        self.client.get(f"/api/info/event/{self.event.id}")
+        after = self.get_metrics()
+
+        def increase(name, **labels):
+            return self.get_sample(after, name, **labels) - (
+                self.get_sample(before, name, **labels) or 0
+            )
+
+        self.assertEqual(
+            1,
+            increase(
+                "http_request_duration_seconds_count",
+                route=route,
+                method="GET",
+                status=200,
+            ),
+        )
+        self.assertGreater(increase("http_request_db_queries_sum", route=route), 0)
+        # daily repeats from 19th till 23rd of April
+        self.assertEqual(
+            5, increase("http_request_expanded_occurrences_sum", route=route)
+        )
+        self.assertGreater(increase("min_stream_heap_size_count"), 0)
+        self.assertGreaterEqual(
+            increase("cache_requests_total", cache="description", result="hit"), 1
+        )
+        self.assertIsNotNone(
+            self.get_sample(after, "cache_hit_ratio", cache="description")
+        )
+
+    def test_middleware_stays_async(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        # Django doesn't adapt middleware which is coroutine function to sync one
+        middleware = metrics.MetricsMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get("/unknown"))
+        self.assertEqual(200, response.status_code)
+
+    async def test_async_request_metrics(self):
+        route = "api/info/user/<int:user_id>/events"
+        url = f"/api/info/user/{self.owner.id}/events?from=2022-04-15T00:00:00&till=2022-04-24T00:00:00"
+        before = await sync_to_async(self.get_metrics)()
+        # requests of ASGI handler go through async path of middleware
+        response = await self.async_client.get(url)
+        self.assertEqual(200, response.status_code)
+        after = await sync_to_async(self.get_metrics)()
+
+        def increase(name, **labels):
+            return self.get_sample(after, name, **labels) - (
+                self.get_sample(before, name, **labels) or 0
+            )
+
+        labels = dict(route=route, method="GET", status=200)
+        self.assertEqual(1, increase("http_request_duration_seconds_count", **labels))
+        self.assertGreater(increase("http_request_db_queries_sum", route=route), 0)
+        self.assertEqual(
+            5, increase("http_request_expanded_occurrences_sum", route=route)
+        )
+
+    def test_metrics_of_processes_are_summed(self):
+        route = "api/info/event/<int:event_id>"
+        self.client.get(f"/api/info/event/{self.event.id}")
+        text = self.get_metrics()
+        labels = dict(route=route, method="GET", status=200)
+        count = self.get_sample(text, "http_request_duration_seconds_count", **labels)
+
+        # other worker process with the same metrics
+        shutil.copy(
+            os.path.join(self.metrics_dir, f"{os.getpid()}.json"),
+            os.path.join(self.metrics_dir, "1.json"),
+        )
+        text = self.get_metrics()
+        self.assertEqual(
+            2 * count,
+            self.get_sample(text, "http_request_duration_seconds_count", **labels),
+        )
+        self.assertEqual(
+            2 * count,
+            self.get_sample(
+                text,
+                "http_request_duration_seconds_bucket",
+                **labels,
+                le="+Inf",
+            ),
+        )
+
+    def test_metrics_are_shown_to_local_addresses_only(self):
+        response = self.client.get("/api/metrics", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(403, response.status_code)
+
+    def test_render(self):
+        registry = metrics.Registry()
+        registry.counter("jobs_total", "Jobs", ("kind",)).inc(kind='say "hi"')
+        registry.histogram("job_seconds", "Jobs", buckets=(1, 2)).observe(1.5)
+        self.assertEqual(
+            "# HELP job_seconds Jobs\n"
+            "# TYPE job_seconds histogram\n"
+            'job_seconds_bucket{le="1"} 0\n'
+            'job_seconds_bucket{le="2"} 1\n'
+            'job_seconds_bucket{le="+Inf"} 1\n'
+            "job_seconds_sum 1.5\n"
+            "job_seconds_count 1\n"
+            "# HELP jobs_total Jobs\n"
+            "# TYPE jobs_total counter\n"
+            'jobs_total{kind="say \\"hi\\""} 1\n',
+            metrics.render(registry.snapshot()),
+        )
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "EXPLAIN plans are checked on PostgreSQL"
+)
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            User(username=f"user{i}", email=f"user{i}@example.com") for i in range(1000)
+        )
+        cls.users = list(User.objects.order_by("id"))
+        start = parse_datetime("2022-04-19T15:00:00Z")
+        Event.objects.bulk_create(
+            Event(
+                title=f"Event {i}",
+                start=start + datetime.timedelta(hours=i),
+                end=start + datetime.timedelta(hours=i + 1),
+                owner_id=cls.users[i % len(cls.users)].id,
+                is_recurring=i % 2 == 0,
+            )
+            for i in range(10_000)
+        )
+        events = list(Event.objects.order_by("id"))
+        RRule.objects.bulk_create(
+            RRule(
+                event_id=event.id,
+                start=event.start,
+                interval=datetime.timedelta(days=1),
+            )
+            for event in events
+            if event.is_recurring
+        )
+        Invite.objects.bulk_create(
+            Invite(
+                event_id=event.id,
+                user_id=cls.users[(i * 7 + 1) % len(cls.users)].id,
+                status=Invite.Status.values[i % len(Invite.Status.values)],
+            )
+            for i, event in enumerate(events)
+        )
+        cls.event = events[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertIndexScan(self, queryset, index_name=None):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan)
+        self.assertIn("Index", plan)
+        if index_name is not None:
+            self.assertIn(index_name, plan)
+
+    def test_invites_by_user_and_status(self):
+        user = self.users[1]
+        self.assertIndexScan(user.get_invites_by_status(Invite.Status.PENDING))
+        self.assertIndexScan(user.get_all_invites().order_by("id")[:10])
+
+    def test_invites_by_event(self):
+        self.assertIndexScan(Invite.objects.filter(event_id=self.event.id))
+
+    def test_events_by_owner_and_start(self):
+        user = self.users[1]
+        self.assertIndexScan(
+            Event.objects.filter(owner_id=user.id, start__lte=self.event.end)
+        )
+
+    def test_rrules_by_event_and_start(self):
+        self.assertIndexScan(
+            RRule.objects.filter(event_id=self.event.id, start__lte=self.event.end)
+        )
+
+    def test_user_by_email(self):
+        self.assertIndexScan(
+            User.objects.filter(email="user1@example.com"), "core_user_email_uniq"
+        )
+
+
+class AsyncViewsTests(TransactionTestCase):
+    # async views query database from other threads, so data should be committed
+
+    def setUp(self):
+        cache.clear()
+        busy_index.clear()
+        self.user = User(first_name="John", email="johndoe@gmail.com", username="john")
+        self.user.set_password("mysecretpassword")
+        self.user.save()
+        self.guest = User.objects.create(first_name="Guest", username="guest")
+        now = timezone.now().replace(microsecond=0)
+        self.event = Event.objects.create(
+            title="Event example",
+            start=now + datetime.timedelta(minutes=30),
+            end=now + datetime.timedelta(hours=2),
+            owner_id=self.user.id,
+            is_recurring=True,
+        )
+        RRule.daily(event_id=self.event.id, start=self.event.start).save()
+        Invite.objects.create(
+            user_id=self.guest.id, event_id=self.event.id, status=Invite.Status.ACCEPTED
+        )
+        self.client.login(username="john", password="mysecretpassword")
+
+    def assertSameResponses(self, url):
+        sync_response = self.client.get(f"/api/{url}")
+        async_response = self.client.get(f"/api/async/{url}")
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        self.assertEqual(sync_response.get("ETag"), async_response.get("ETag"))
+        self.assertEqual(sync_response.getvalue(), b"".join(async_response))
+        return async_response
+
+    def test_info_views(self):
+        self.assertSameResponses(f"info/event/{self.event.id}")
+        self.assertSameResponses(f"info/event/{self.event.id + 1}")
+        self.assertSameResponses("info/invites?status=PENDING")
+        events_url = f"info/user/{self.guest.id}/events?from=2022-04-15T00:00:00&till=2030-01-01T00:00:00&limit=3"
+        self.assertSameResponses(events_url)
+        self.assertSameResponses(f"{events_url}&stream=1")
+
+        etag = self.client.get(f"/api/async/info/event/{self.event.id}")["ETag"]
+        response = self.client.get(
+            f"/api/async/info/event/{self.event.id}", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(304, response.status_code)
+
+    def test_middleware_chain_stays_async(self):
+        # sync only middleware would make Django run whole chain in one shared thread
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    @override_settings(PROFILING_ENABLED=True)
+    async def test_queries_of_async_views_are_profiled(self):
+        url = f"/api/async/info/user/{self.guest.id}/events?from=2022-04-15T00:00:00&till=2030-01-01T00:00:00&limit=3"
+        response = await self.async_client.get(url, **{"X-Profile": "1"})
+        self.assertEqual(200, response.status_code)
+        profile = profiling.profiles[-1]
+        self.assertEqual(str(profile["id"]), response["X-Profile-Id"])
+        # queries run in threads of pool are recorded too
+        self.assertGreater(profile["queries"], 0)
+        callers = [caller["caller"] for caller in profile["callers"]]
+        self.assertIn("core/models.py:get_events_by_time_period", callers)
+
+    def test_free_time_slot(self):
+        url = f"timetable/free_time_slot?user_ids={self.user.id},{self.guest.id}&duration=1:00:00"
+        response = self.assertSameResponses(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            self.event.end, parse_datetime(response.json()["start"]).astimezone()
+        )
+        self.assertSameResponses("timetable/free_time_slot?user_ids=1,x&duration=1:00")
+
+
+class DbHealthChecksTests(TransactionTestCase):
+    # TestCase wraps connection in transaction, which isn't checked
+
+    def test_broken_connection_is_closed(self):
+        connection.ensure_connection()
+        # connection is persistent, so Django itself doesn't close it after request
+        with mock.patch.object(connection, "close_at", None), mock.patch.object(
+            connection, "close"
+        ) as close:
+            with mock.patch.object(connection, "is_usable", return_value=True):
+                request_started.send(sender=self.__class__)
+                connection.cursor().close()
+            close.assert_not_called()
+
+            with mock.patch.object(
+                connection, "is_usable", return_value=False
+            ) as is_usable:
+                request_started.send(sender=self.__class__)
+                # connection isn't checked until it is used
+                is_usable.assert_not_called()
+                connection.cursor().close()
+                connection.cursor().close()
+                # and it is checked once per request
+                is_usable.assert_called_once()
+                with override_settings(DB_HEALTH_CHECKS=False):
+                    request_started.send(sender=self.__class__)
+                    connection.cursor().close()
+            close.assert_called_once()
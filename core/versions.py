@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _version_key(kind, id):
+    return f"version:{kind}:{id}"
+
+
+def get_version(kind, id) -> int:
+    """
+    Current version of object (kind "event" or "user"), changes after every bump_versions
+    """
+    cache = caches[settings.VERSIONS_CACHE_ALIAS]
+    key = _version_key(kind, id)
+    version = cache.get(key)
+    if version is None:
+        # versions start from current time, so version lost by eviction is never repeated
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(kind, ids):
+    """
+    Change versions of objects now and once more after commit of current transaction,
+    so values cached by concurrent readers before commit are not reused
+    """
+    cache = caches[settings.VERSIONS_CACHE_ALIAS]
+    keys = [_version_key(kind, id) for id in set(ids)]
+
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass  # missing version is started on the next get_version
+
+    bump()
+    transaction.on_commit(bump)
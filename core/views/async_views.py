@@ -0,0 +1,77 @@
+import asyncio
+import datetime
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.timezone import make_aware
+
+from core.busy_index import busy_index
+from core.views import info_views, timetable_views
+from core.views.response import api_response
+
+# Django 4.0 has no async ORM interface, so database is queried in threads of pool
+# (not in the single thread of sync views), and several queries can run concurrently
+
+
+def db_sync_to_async(func):
+    """
+    Like sync_to_async, but func runs in pool thread and database connections
+    of that thread are closed when they are too old or broken (as after request)
+    """
+
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+async def info_event(request, event_id):
+    return await db_sync_to_async(info_views.info_event)(request, event_id)
+
+
+async def info_user_invites(request):
+    return await db_sync_to_async(info_views.info_user_invites)(request)
+
+
+async def info_user_events(request, user_id):
+    def render(request, user_id):
+        response = info_views.info_user_events(request, user_id)
+        if not response.streaming:
+            return response
+        # ASGI handler iterates streaming content in event loop, where database can't be used,
+        # so page is rendered in pool thread
+        rendered = HttpResponse(b"".join(response.streaming_content))
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    return await db_sync_to_async(render)(request, user_id)
+
+
+async def get_first_free_time_slot(request):
+    params, err = timetable_views.validate_free_time_slot_params(request)
+    if err:
+        return err
+    user_ids, duration, engine, horizon, count = params
+
+    # found user for each user_id
+    users, err = await db_sync_to_async(timetable_views.exist_users)(user_ids)
+    if err:
+        return err
+
+    min_start = make_aware(datetime.datetime.now())
+    # occupancy of users is loaded concurrently, then search reads it from busy index
+    await asyncio.gather(
+        *(db_sync_to_async(busy_index.load)(user, min_start) for user in users)
+    )
+    slots, limit_exceeded = await db_sync_to_async(
+        timetable_views.find_free_time_slots
+    )(users, duration, engine, min_start, min_start + horizon, count or 1)
+    return api_response(
+        request, timetable_views.free_time_slots_data(slots, count, limit_exceeded)
+    )
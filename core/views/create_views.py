@@ -3,12 +3,18 @@ from json import JSONDecodeError
 
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 
-from core.models import Event, Invite, RRule, User
+from core.busy_index import busy_index
+from core.models import Event, EventOccurrence, Invite, RRule, User
+from core.versions import bump_versions
+from core.views.response import api_response
 
 
 @csrf_exempt
@@ -41,8 +47,8 @@ def create_user(request):
     except ValidationError as e:
         return HttpResponseBadRequest(f"Your password is not valid because {e}")
 
-    # check if such user exists
-    if len(User.objects.filter(email=email)) > 0:
+    # check if such user exists, email is unique index (see migration 0007)
+    if User.objects.filter(email=email).exists():
         return HttpResponseBadRequest("User with such email already exists")
 
     # create and save user
@@ -50,88 +56,244 @@ def create_user(request):
         username=username, first_name=first_name, last_name=last_name, email=email
     )
     user.set_password(password)
-    user.save()
+    try:
+        # user with the same username or email can be created concurrently
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        return HttpResponseBadRequest("User with such username or email already exists")
     return HttpResponse(f"{user} has been created")
 
 
-@csrf_exempt
-def create_event(request):
-    if not request.user.is_authenticated:
-        return HttpResponseBadRequest("You are not logged in to create event")
-
-    if request.method != "POST":
-        return HttpResponseBadRequest("The HTTP request should be POST type")
-
+def validate_event_data(body_data):
+    """
+    Validate event description (as it's posted to create event)
+    Returns (event_data, None) or (None, error message)
+    """
     # required fields
     try:
-        body_data = json.loads(request.body)
         title = body_data["title"]
         start = parse_datetime(body_data["start"])
         end = parse_datetime(body_data["end"])
-    except JSONDecodeError:
-        return HttpResponseBadRequest("Request body is not valid JSON")
     except KeyError as e:
-        return HttpResponseBadRequest(f"Your POST query has no key {e}")
-    except ValueError as e:
-        return HttpResponseBadRequest(f"Input params is not valid because {e}")
+        return None, f"Your POST query has no key {e}"
+    except (TypeError, ValueError) as e:
+        return None, f"Input params is not valid because {e}"
 
     # validate start & end
     if start is None or end is None:
-        return HttpResponseBadRequest(
-            f"Your {body_data['start']} and {body_data['end']} aren't valid format"
+        return (
+            None,
+            f"Your {body_data['start']} and {body_data['end']} aren't valid format",
         )
     if start > end:
-        return HttpResponseBadRequest("End date should be greater than start date")
+        return None, "End date should be greater than start date"
 
     # optional fields
     description = body_data.get("description") or ""
     is_private = bool(body_data.get("is_private") or False)
     is_recurring = bool(body_data.get("is_recurring") or False)
     invited_emails = body_data.get("invited_emails") or []
+    if not isinstance(invited_emails, list) or not all(
+        isinstance(email, str) for email in invited_emails
+    ):
+        return None, "invited_emails should be list of strings"
+
+    # validate text fields, which are limited by columns of Event
+    for field, value in (("title", title), ("description", description)):
+        if not isinstance(value, str):
+            return None, f"{field} should be string"
+        max_length = Event._meta.get_field(field).max_length
+        if len(value) > max_length:
+            return None, f"{field} should be at most {max_length} characters long"
 
     # validate repeats
-    repeats = None
+    repeats = []
     if is_recurring:
         repeats = body_data.get("repeats")
         if repeats is None:
-            return HttpResponseBadRequest("Event is recurring but no repeats provided")
+            return None, "Event is recurring but no repeats provided"
+        if not isinstance(repeats, list) or not all(
+            isinstance(repeat, str) for repeat in repeats
+        ):
+            return None, "repeats should be list of strings"
         default_rrules = {"daily", "weekly", "monthly", "yearly"}
         for repeat in repeats:
             if repeat not in default_rrules:
-                return HttpResponseBadRequest(
-                    f"Repeat value {repeat} is not valid. Valid is {default_rrules}"
+                return (
+                    None,
+                    f"Repeat value {repeat} is not valid. Valid is {default_rrules}",
                 )
 
-    # create event
+    event_data = {
+        "title": title,
+        "description": description,
+        "start": start,
+        "end": end,
+        "is_recurring": is_recurring,
+        "is_private": is_private,
+        "repeats": list(dict.fromkeys(repeats)),
+        "invited_emails": invited_emails,
+    }
+    return event_data, None
+
+
+def build_rrules(event, repeats):
+    default_rrules = {
+        "daily": RRule.daily,
+        "weekly": RRule.weekly,
+        "monthly": RRule.monthly,
+        "yearly": RRule.yearly,
+    }
+    return [default_rrules[repeat](event.id, event.start) for repeat in repeats]
+
+
+@csrf_exempt
+def create_event(request):
+    if not request.user.is_authenticated:
+        return HttpResponseBadRequest("You are not logged in to create event")
+
+    if request.method != "POST":
+        return HttpResponseBadRequest("The HTTP request should be POST type")
+
+    try:
+        body_data = json.loads(request.body)
+    except JSONDecodeError:
+        return HttpResponseBadRequest("Request body is not valid JSON")
+    event_data, err = validate_event_data(body_data)
+    if err:
+        return HttpResponseBadRequest(err)
+    repeats = event_data.pop("repeats")
+    invited_emails = event_data.pop("invited_emails")
+
+    # create event with its repeats and invites as one atomic unit
     owner = request.user
-    event = Event(
-        title=title,
-        description=description,
-        start=start,
-        end=end,
-        owner_id=owner.id,
-        is_recurring=is_recurring,
-        is_private=is_private,
-    )
-    event.save()
-
-    # create repeats
-    if repeats:
-        default_rrules = {
-            "daily": RRule.daily(event.id, event.start),
-            "weekly": RRule.weekly(event.id, event.start),
-            "monthly": RRule.monthly(event.id, event.start),
-            "yearly": RRule.yearly(event.id, event.start),
-        }
-        for repeat in repeats:
-            default_rrules[repeat].save()
+    with transaction.atomic():
+        event = Event(owner_id=owner.id, **event_data)
+        event.save()
+
+        # create repeats
+        if repeats:
+            RRule.objects.bulk_create(build_rrules(event, repeats))
+            # bulk_create doesn't send signals, so occurrences are materialized here
+            event.rebuild_occurrences()
+            busy_index.invalidate([owner.id])
+
+        # create invites, they are pending and don't change occupancy of users
+        invited_user_ids = list(
+            User.objects.filter(email__in=invited_emails).values_list("id", flat=True)
+        )
+        Invite.objects.bulk_create(
+            Invite(user_id=user_id, event_id=event.id) for user_id in invited_user_ids
+        )
+        # bulk_create doesn't send signals, so invites of users are changed here
+        bump_versions("user", [owner.id, *invited_user_ids])
+
+    return api_response(request, event.deep_description())
+
+
+def create_events_batch(owner_id, events_data):
+    """
+    Insert events with their repeats, invites and occurrences using bulk inserts
+    """
+    # resolve invited emails in chunks
+    emails = list({email for data in events_data for email in data["invited_emails"]})
+    email2user_id = {}
+    chunk_size = settings.BULK_IMPORT_EMAILS_CHUNK_SIZE
+    for i in range(0, len(emails), chunk_size):
+        email2user_id.update(
+            User.objects.filter(email__in=emails[i : i + chunk_size]).values_list(
+                "email", "id"
+            )
+        )
+
+    occurrences_until = timezone.now() + settings.OCCURRENCES_HORIZON
+    with transaction.atomic():
+        events = Event.objects.bulk_create(
+            Event(
+                owner_id=owner_id,
+                occurrences_until=occurrences_until,
+                **{
+                    key: value
+                    for key, value in data.items()
+                    if key not in ("repeats", "invited_emails")
+                },
+            )
+            for data in events_data
+        )
+        RRule.objects.bulk_create(
+            rrule
+            for event, data in zip(events, events_data)
+            for rrule in build_rrules(event, data["repeats"])
+        )
+        invites = Invite.objects.bulk_create(
+            Invite(user_id=email2user_id[email], event_id=event.id)
+            for event, data in zip(events, events_data)
+            for email in dict.fromkeys(data["invited_emails"])
+            if email in email2user_id
+        )
+        # bulk_create doesn't send signals, so events and invites of users are changed here
+        bump_versions("user", [owner_id, *(invite.user_id for invite in invites)])
+
+        # bulk_create doesn't send signals, so occurrences are materialized here,
+        # invites are pending and only owner is busy with imported events
+        events = Event.objects.filter(id__in=[event.id for event in events])
+        EventOccurrence.objects.bulk_create(
+            (
+                occurrence
+                for event in events.prefetch_related("rrule_set")
+                for occurrence in event.build_occurrences(
+                    [owner_id], till_time=occurrences_until
+                )
+            ),
+            batch_size=settings.OCCURRENCES_BATCH_SIZE,
+        )
+
+
+@csrf_exempt
+def import_events(request):
+    if not request.user.is_authenticated:
+        return HttpResponseBadRequest("You are not logged in to import events")
+
+    if request.method != "POST":
+        return HttpResponseBadRequest("The HTTP request should be POST type")
+
+    batch_size = request.GET.get("batch_size", settings.BULK_IMPORT_BATCH_SIZE)
+    try:
+        batch_size = int(batch_size)
+    except ValueError:
+        return HttpResponseBadRequest(f"Batch size {batch_size} is not valid")
+    if not 0 < batch_size <= settings.BULK_IMPORT_MAX_BATCH_SIZE:
+        return HttpResponseBadRequest(
+            f"Batch size should be in [1, {settings.BULK_IMPORT_MAX_BATCH_SIZE}]"
+        )
 
-    # create invites
-    invited_users = User.objects.filter(email__in=invited_emails)
-    for invited_user in invited_users:
-        Invite(
-            user_id=invited_user.id,
-            event_id=event.id,
-        ).save()
+    # body is read line by line (one event per line), so it's never buffered whole
+    owner_id = request.user.id
+    created = 0
+    errors = []
+    batch = []
+    for line_number, line in enumerate(request, start=1):
+        if not line.strip():
+            continue
+        try:
+            body_data = json.loads(line)
+        except JSONDecodeError:
+            errors.append({"line": line_number, "error": "Line is not valid JSON"})
+            continue
+        event_data, err = validate_event_data(body_data)
+        if err:
+            errors.append({"line": line_number, "error": err})
+            continue
+        batch.append(event_data)
+        if len(batch) == batch_size:
+            create_events_batch(owner_id, batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        create_events_batch(owner_id, batch)
+        created += len(batch)
 
-    return JsonResponse(event.deep_description(), json_dumps_params={"indent": 3})
+    if created:
+        busy_index.invalidate([owner_id])
+    return api_response(request, {"created": created, "errors": errors})
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+
+from core import metrics, profiling
+from core.views.response import api_response
+
+
+def debug_profiles(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden("Only staff users can look up profiles")
+
+    profile_id = request.GET.get("id")
+    if profile_id is None:
+        return api_response(request, {"profiles": list(reversed(profiling.profiles))})
+
+    try:
+        profile_id = int(profile_id)
+    except ValueError:
+        return HttpResponseBadRequest(f"Profile id {profile_id} is not valid")
+    for profile in profiling.profiles:
+        if profile["id"] == profile_id:
+            return api_response(request, {"profile": profile})
+    return HttpResponseBadRequest(f"Profile with id {profile_id} is not in buffer")
+
+
+def show_metrics(request):
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_ADDRESSES:
+        return HttpResponseForbidden("Metrics are shown to local addresses only")
+    snapshot = metrics.registry.collect()
+    return HttpResponse(metrics.render(snapshot), content_type=metrics.CONTENT_TYPE)
@@ -1,10 +1,38 @@
-from django.http import HttpResponseBadRequest, JsonResponse
+import json
+
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.utils.dateparse import parse_datetime
-from django.utils.timezone import make_aware
+from django.utils.timezone import is_naive, make_aware
+from django.views.decorators.http import condition
+
+from core.common.cursor import decode_cursor, encode_cursor
+from core.description_cache import description_cache
+from core.models import Invite, User
+from core.versions import get_version
+from core.views.response import api_response, representation
+
+
+def event_etag(request, event_id):
+    # description depends on whether user is related to event
+    return (
+        f"event-{event_id}-{get_version('event', event_id)}"
+        f"-{request.user.id}-{representation(request)}"
+    )
+
+
+def user_invites_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    user_id = request.user.id
+    return f"invites-{user_id}-{get_version('user', user_id)}-{representation(request)}"
 
-from core.models import Event, Invite, User
 
-JSON_DUMPS_PARAMS = {"indent": 3}
+def user_events_etag(request, user_id):
+    # private events are hidden depending on request user
+    return (
+        f"events-{user_id}-{get_version('user', user_id)}"
+        f"-{request.user.id}-{representation(request)}"
+    )
 
 
 def exist_user(user_id):
@@ -14,55 +42,76 @@ def exist_user(user_id):
     return user_query[0], None
 
 
-def exist_event(event_id):
-    event_query = Event.objects.filter(id=event_id)
-    if len(event_query) == 0:
-        return None, HttpResponseBadRequest(f"No event with such id = {event_id}")
-    return event_query[0], None
+def validate_limit(limit):
+    try:
+        value = int(limit)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        return None, HttpResponseBadRequest(f"Limit {limit} is not valid")
+    return value, None
 
 
+@condition(etag_func=event_etag)
 def info_event(request, event_id):
-    event, err = exist_event(event_id)
-    if err:
-        return err
-
-    related_user_ids = event.get_related_user_ids()
-    if not event.is_private or request.user.id in related_user_ids:
-        return JsonResponse(
-            event.deep_description(), json_dumps_params=JSON_DUMPS_PARAMS
-        )
-    else:
-        return JsonResponse(
-            event.hidden_description(), json_dumps_params=JSON_DUMPS_PARAMS
-        )
+    # only partial info is shown if event is private for user
+    description = description_cache.get_description(event_id, request.user.id)
+    if description is None:
+        return HttpResponseBadRequest(f"No event with such id = {event_id}")
+    return api_response(request, description)
 
 
 def info_user(request, user_id):
     user, err = exist_user(user_id)
     if err:
         return err
-    return JsonResponse({"user": str(user)}, json_dumps_params=JSON_DUMPS_PARAMS)
+    return api_response(request, {"user": str(user)})
 
 
+@condition(etag_func=user_invites_etag)
 def info_user_invites(request):
     if not request.user.is_authenticated:
         return HttpResponseBadRequest("You are not logged in to lookup your invites")
 
     invite_status = request.GET.get("status")
+    if invite_status is not None and invite_status not in Invite.Status.names:
+        return HttpResponseBadRequest(f"Status {invite_status} is not valid")
+
+    limit = request.GET.get("limit")
+    if limit is not None:
+        limit, err = validate_limit(limit)
+        if err:
+            return err
+
+    after_id = None
+    cursor = request.GET.get("cursor")
+    if cursor is not None:
+        try:
+            after_id = int(decode_cursor(cursor))
+        except (TypeError, ValueError) as e:
+            return HttpResponseBadRequest(f"Cursor is not valid because {e}")
+
+    user = User.objects.get(id=request.user.id)
     if invite_status is not None:
-        if invite_status not in Invite.Status.names:
-            return HttpResponseBadRequest(f"Status {invite_status} is not valid")
-        user = User.objects.get(id=request.user.id)
         invites = user.get_invites_by_status(status=Invite.Status[invite_status])
     else:
-        user = User.objects.get(id=request.user.id)
         invites = user.get_all_invites()
-    return JsonResponse(
-        {"invites": [str(invite) for invite in invites]},
-        json_dumps_params=JSON_DUMPS_PARAMS,
-    )
-
-
+    # keyset pagination by invite id, user and event are needed for str(invite)
+    invites = invites.select_related("user", "event").order_by("id")
+    if after_id is not None:
+        invites = invites.filter(id__gt=after_id)
+
+    response_data = {}
+    if limit is not None:
+        invites = list(invites[: limit + 1])
+        if len(invites) > limit:
+            invites = invites[:limit]
+            response_data["next_cursor"] = encode_cursor(invites[-1].id)
+    response_data["invites"] = [str(invite) for invite in invites]
+    return api_response(request, response_data)
+
+
+@condition(etag_func=user_events_etag)
 def info_user_events(request, user_id):
     from_time = request.GET.get("from")
     till_time = request.GET.get("till")
@@ -79,25 +128,104 @@ def info_user_events(request, user_id):
     except ValueError as e:
         return HttpResponseBadRequest(f"Input params is not valid because {e}")
 
+    limit = request.GET.get("limit")
+    if limit is not None:
+        limit, err = validate_limit(limit)
+        if err:
+            return err
+
+    after = None
+    cursor = request.GET.get("cursor")
+    if cursor is not None:
+        try:
+            after = parse_events_cursor(cursor)
+        except (TypeError, ValueError) as e:
+            return HttpResponseBadRequest(f"Cursor is not valid because {e}")
+        # instances before cursor position are not needed
+        from_time = max(from_time, after[0][0])
+
     user, err = exist_user(user_id)
     if err:
         return err
 
-    events_instances = user.get_events_instances_by_time_period(from_time, till_time)
-    event2related_user_ids = {}
-    for _, event in events_instances:
-        if event not in event2related_user_ids:
-            event2related_user_ids[event] = event.get_related_user_ids()
+    # instances come sorted by (start, end, event id)
+    events_instances = user.iter_events_instances_by_time_period(from_time, till_time)
+    page = {}
+    pretty_events = iter_events_page(request, events_instances, after, limit, page)
+
+    if request.GET.get("stream") in ("1", "true"):
+        return StreamingHttpResponse(
+            stream_events_page(pretty_events, page), content_type="application/json"
+        )
 
-    # sort events by start
-    events_instances = sorted(events_instances, key=lambda it: it[0][0])
-    pretty_events = []
+    response_data = {"events": list(pretty_events)}
+    response_data.update(page)
+    return api_response(request, response_data)
+
+
+def parse_events_cursor(cursor):
+    """
+    Cursor position is key (start, end, event id) of the last returned instance
+    and number of returned instances with the same key
+    """
+    start, end, event_id, same_key_count = decode_cursor(cursor)
+    start, end = parse_datetime(start), parse_datetime(end)
+    if start is None or end is None:
+        raise ValueError("start and end of cursor are not valid")
+    # cursors are made from aware instances, naive ones can't be compared with them
+    if is_naive(start) or is_naive(end):
+        raise ValueError("start and end of cursor should have timezone")
+    return (start, end, int(event_id)), int(same_key_count)
+
+
+def iter_events_page(request, events_instances, after=None, limit=None, page=None):
+    """
+    Pretty strings of sorted events instances which follow cursor position after, at most limit of them
+    If there are instances left, cursor of the next page is saved into page["next_cursor"]
+    """
+    last_key, same_key_count = after if after else (None, 0)
+    skipped, count = 0, 0
+    event2related_user_ids = {}
     for (start, end), event in events_instances:
+        key = (start, end, event.id)
+        if after is not None and key <= after[0]:
+            if key < after[0]:
+                continue
+            # only instances with key of cursor were counted into its position
+            if skipped < after[1]:
+                skipped += 1
+                continue
+
+        if limit is not None and count == limit:
+            page["next_cursor"] = encode_cursor(
+                [
+                    last_key[0].isoformat(),
+                    last_key[1].isoformat(),
+                    last_key[2],
+                    same_key_count,
+                ]
+            )
+            return
+        same_key_count = same_key_count + 1 if key == last_key else 1
+        last_key = key
+        count += 1
+
+        if event.is_private and event not in event2related_user_ids:
+            event2related_user_ids[event] = event.get_related_user_ids()
         if event.is_private and request.user.id not in event2related_user_ids[event]:
-            pretty_events.append(
-                f"Start={start}, End={end}, Title=(PRIVATE)"
-            )  # like hidden format
+            yield f"Start={start}, End={end}, Title=(PRIVATE)"  # like hidden format
         else:
-            pretty_events.append(f"Start={start}, End={end}, Title={str(event)}")
-
-    return JsonResponse({"events": pretty_events}, json_dumps_params=JSON_DUMPS_PARAMS)
+            yield f"Start={start}, End={end}, Title={str(event)}"
+
+
+def stream_events_page(pretty_events, page):
+    """
+    JSON of events page produced chunk by chunk
+    """
+    yield '{"events":['
+    for i, pretty_event in enumerate(pretty_events):
+        yield ("," if i else "") + json.dumps(pretty_event, ensure_ascii=False)
+    yield "]"
+    if "next_cursor" in page:
+        yield f',"next_cursor":{json.dumps(page["next_cursor"])}'
+    yield "}"
@@ -0,0 +1,81 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, see "orjson" extra in pyproject.toml
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, see "msgpack" extra in pyproject.toml
+    msgpack = None
+
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# datetimes, durations etc. are encoded the same way by every encoder
+_encode_default = DjangoJSONEncoder().default
+
+
+def encode_json(data, indent=None) -> bytes:
+    """
+    Compact JSON (or indented if indent is set), encoded by orjson when it's installed
+    """
+    if orjson is not None and indent is None:
+        return orjson.dumps(
+            data, default=_encode_default, option=orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    return json.dumps(
+        data,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        indent=indent,
+        separators=None if indent else (",", ":"),
+    ).encode()
+
+
+def encode_msgpack(data) -> bytes:
+    return msgpack.packb(data, default=_encode_default, use_bin_type=True)
+
+
+def accepts_msgpack(request) -> bool:
+    if msgpack is None:
+        return False
+    accept = request.headers.get("Accept", "")
+    return any(content_type in accept for content_type in MSGPACK_CONTENT_TYPES)
+
+
+def accepts_gzip(request) -> bool:
+    return "gzip" in request.headers.get("Accept-Encoding", "")
+
+
+def representation(request) -> str:
+    """
+    Name of representation which api_response chooses for request, e.g. to be part of ETag
+    """
+    name = "msgpack" if accepts_msgpack(request) else "json"
+    return f"{name}-gzip" if accepts_gzip(request) else name
+
+
+def api_response(request, data, status=200) -> HttpResponse:
+    """
+    Response with data encoded in format chosen by Accept header (JSON by default, MessagePack)
+    Bodies longer than API_GZIP_MIN_LENGTH are gzipped if client accepts it
+    """
+    if accepts_msgpack(request):
+        content, content_type = encode_msgpack(data), MSGPACK_CONTENT_TYPES[0]
+    else:
+        content = encode_json(data, indent=settings.API_JSON_INDENT)
+        content_type = "application/json"
+
+    response = HttpResponse(content, content_type=content_type, status=status)
+    patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+    if len(content) >= settings.API_GZIP_MIN_LENGTH and accepts_gzip(request):
+        response.content = compress_string(content)
+        response["Content-Encoding"] = "gzip"
+    return response
@@ -1,52 +1,267 @@
 import datetime
+import json
+from json import JSONDecodeError
 
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.conf import settings
+from django.http import HttpResponseBadRequest
 from django.utils.dateparse import parse_duration
 from django.utils.timezone import make_aware
+from django.views.decorators.csrf import csrf_exempt
 
+from core.busy_index import busy_index
+from core.common.bitset_slots import bitset_free_slots, np
+from core.common.free_slots import (
+    ExaminedLimit,
+    SearchLimitExceeded,
+    free_slots,
+    take_slots,
+    until,
+)
 from core.common.segment_union import union_stream
+from core.common.shared_stream import SharedStream
 from core.models import User
+from core.views.response import api_response
 
 
-def get_first_free_time_slot(request):
+def validate_duration(duration):
+    duration = parse_duration(duration) if isinstance(duration, str) else None
+    if duration is None or duration <= datetime.timedelta(0):
+        return None, HttpResponseBadRequest("Your duration is not valid")
+    return duration, None
+
+
+def validate_horizon(horizon):
+    if horizon is None:
+        return settings.FREE_SLOT_MAX_HORIZON, None
+    horizon = parse_duration(horizon) if isinstance(horizon, str) else None
+    if (
+        horizon is None
+        or horizon <= datetime.timedelta(0)
+        or horizon > settings.FREE_SLOT_MAX_HORIZON
+    ):
+        return None, HttpResponseBadRequest("Your horizon is not valid")
+    return horizon, None
+
+
+def validate_count(count):
+    if not isinstance(count, int) or not 0 < count <= settings.FREE_SLOT_MAX_COUNT:
+        return None, HttpResponseBadRequest(f"Provided count {count} is not valid")
+    return count, None
+
+
+def exist_users(user_ids):
+    users = User.objects.filter(id__in=user_ids)
+    if len(users) < len(set(user_ids)):
+        not_found_ids = set(user_ids) - set(user.id for user in users)
+        return None, HttpResponseBadRequest(f"No user found for ids = {not_found_ids}")
+    return users, None
+
+
+def validate_free_time_slot_params(request):
+    """
+    Returns ((user_ids, duration, engine, horizon, count), None) or (None, HttpResponseBadRequest)
+    count is None unless it's provided
+    """
     # get and validate user_ids param
     user_ids_param = request.GET.get("user_ids")
     if user_ids_param is None:
-        return HttpResponseBadRequest("No user_ids are provided")
+        return None, HttpResponseBadRequest("No user_ids are provided")
     user_ids = user_ids_param.split(",")
     try:
         user_ids = [int(id) for id in user_ids]
     except ValueError:
-        return HttpResponseBadRequest("Provided user_ids are not valid")
+        return None, HttpResponseBadRequest("Provided user_ids are not valid")
 
     # get and validate duration param
     duration = request.GET.get("duration")
     if duration is None:
-        return HttpResponseBadRequest("No duration is provided")
-    duration = parse_duration(duration)
-    if duration is None or duration <= datetime.timedelta(0):
-        return HttpResponseBadRequest("Your duration is not valid")
+        return None, HttpResponseBadRequest("No duration is provided")
+    duration, err = validate_duration(duration)
+    if err:
+        return None, err
+
+    # get and validate engine param
+    engine = request.GET.get("engine", "heap")
+    if engine not in ("heap", "bitset"):
+        return None, HttpResponseBadRequest(f"Engine {engine} is not valid")
+    if engine == "bitset" and np is None:
+        return None, HttpResponseBadRequest("Engine bitset is not available (no numpy)")
+
+    # get and validate horizon and count params
+    horizon, err = validate_horizon(request.GET.get("horizon"))
+    if err:
+        return None, err
+    count = request.GET.get("count")
+    if count is not None:
+        try:
+            count = int(count)
+        except ValueError:
+            pass  # count which isn't a number is reported by validate_count
+        count, err = validate_count(count)
+        if err:
+            return None, err
+    return (user_ids, duration, engine, horizon, count), None
+
+
+def find_free_time_slots(users, duration, engine, min_start, till_time, count):
+    """
+    Up to count non-overlapping slots (start, end) inside [min_start, till_time] which are free for all users
+    Search stops early after FREE_SLOT_MAX_EXAMINED occupied slots of users
+    Returns (slots, whether search was stopped by the limit)
+    """
+    # limit is shared by both engines, so request never examines more slots
+    limit = ExaminedLimit(settings.FREE_SLOT_MAX_EXAMINED)
+
+    def user_timelines():
+        # occupied slots are seeked to min_start and cut at till_time,
+        # so neither the past nor slots after horizon are expanded
+        return [
+            limit.wrap(
+                until(busy_index.get_occupied_time_slots(user, min_start), till_time)
+            )
+            for user in users
+        ]
+
+    if engine == "bitset":
+        try:
+            slots = bitset_free_slots(
+                user_timelines(),
+                min_start,
+                duration,
+                window=min(settings.FREE_SLOT_BITSET_WINDOW, till_time - min_start),
+                resolution=settings.FREE_SLOT_BITSET_RESOLUTION,
+                count=count,
+            )
+        except SearchLimitExceeded:
+            # window is rasterized only in part, so its free cells can't be trusted
+            return [], True
+        # the last cell may end after till_time
+        slots = [slot for slot in slots if slot[1] <= till_time]
+        if len(slots) == count:
+            return slots, False
+        # not enough free slots inside bitset window, search further with heap engine
+
+    occupied_timeline = union_stream(user_timelines())
+    slots = take_slots(
+        free_slots(occupied_timeline, min_start, duration, till_time), count
+    )
+    return slots, limit.exceeded
+
+
+def free_time_slots_data(slots, count, limit_exceeded):
+    if count is None:
+        # start and end are null when there is no free slot inside horizon
+        start, end = slots[0] if slots else (None, None)
+        return {"start": start, "end": end, "limit_exceeded": limit_exceeded}
+    return {
+        "slots": [{"start": start, "end": end} for start, end in slots],
+        "limit_exceeded": limit_exceeded,
+    }
+
+
+def get_first_free_time_slot(request):
+    params, err = validate_free_time_slot_params(request)
+    if err:
+        return err
+    user_ids, duration, engine, horizon, count = params
 
     # found user for each user_id
-    users = User.objects.filter(id__in=user_ids)
-    if len(users) < len(user_ids):
-        not_found_ids = set(user_ids) - set(user.id for user in users)
-        return HttpResponseBadRequest(f"No user found for ids = {not_found_ids}")
+    users, err = exist_users(user_ids)
+    if err:
+        return err
 
     min_start = make_aware(datetime.datetime.now())
-    occupied_timeline = union_stream([user.get_occupied_time_slots() for user in users])
+    slots, limit_exceeded = find_free_time_slots(
+        users, duration, engine, min_start, min_start + horizon, count or 1
+    )
+    return api_response(request, free_time_slots_data(slots, count, limit_exceeded))
+
+
+@csrf_exempt
+def get_free_time_slots_batch(request):
+    if request.method != "POST":
+        return HttpResponseBadRequest("The HTTP request should be POST type")
+
+    # required fields
     try:
-        start, end = next(occupied_timeline)
-        if min_start + duration <= start:
-            return JsonResponse({"start": min_start, "end": min_start + duration})
-    except StopIteration:
-        # all users are free
-        return JsonResponse({"start": min_start, "end": min_start + duration})
-
-    prev_start, prev_end = start, end
-    for start, end in occupied_timeline:
-        if prev_end + duration <= start:
-            return JsonResponse({"start": prev_end, "end": prev_end + duration})
-        prev_start, prev_end = start, end
-
-    return JsonResponse({"start": end, "end": end + duration})
+        body_data = json.loads(request.body)
+        queries = [
+            (
+                query["user_ids"],
+                query["duration"],
+                query.get("count", 1),
+                query.get("horizon"),
+            )
+            for query in body_data["queries"]
+        ]
+    except JSONDecodeError:
+        return HttpResponseBadRequest("Request body is not valid JSON")
+    except KeyError as e:
+        return HttpResponseBadRequest(f"Your POST query has no key {e}")
+    except TypeError:
+        return HttpResponseBadRequest("queries should be list of objects")
+
+    # validate queries
+    parsed_queries = []
+    for user_ids, duration, count, horizon in queries:
+        if (
+            not isinstance(user_ids, list)
+            or not user_ids
+            or not all(isinstance(id, int) for id in user_ids)
+        ):
+            return HttpResponseBadRequest(f"Provided user_ids {user_ids} are not valid")
+        duration, err = validate_duration(duration)
+        if err:
+            return err
+        count, err = validate_count(count)
+        if err:
+            return err
+        horizon, err = validate_horizon(horizon)
+        if err:
+            return err
+        parsed_queries.append((frozenset(user_ids), duration, count, horizon))
+
+    # all users are loaded once and each user's occupancy is generated once
+    all_user_ids = set().union(*(user_ids for user_ids, _, _, _ in parsed_queries))
+    users, err = exist_users(all_user_ids)
+    if err:
+        return err
+
+    min_start = make_aware(datetime.datetime.now())
+    # occupied slots after the longest horizon of queries are never expanded
+    till_time = min_start + max(
+        (horizon for _, _, _, horizon in parsed_queries), default=datetime.timedelta()
+    )
+    # limit of examined occupied slots is shared by all queries
+    limit = ExaminedLimit(settings.FREE_SLOT_MAX_EXAMINED)
+    user_timelines = {
+        user.id: SharedStream(
+            limit.wrap(
+                until(busy_index.get_occupied_time_slots(user, min_start), till_time)
+            )
+        )
+        for user in users
+    }
+    # merged timelines are shared between queries with the same group of users
+    group_timelines = {}
+    results = []
+    # whether search of query was stopped by limit, so it may have fewer slots than count
+    limit_exceeded = []
+    for user_ids, duration, count, horizon in parsed_queries:
+        if limit.exceeded:
+            # timelines are cut where limit is exceeded, so slots after it can't be trusted
+            results.append([])
+            limit_exceeded.append(True)
+            continue
+        if user_ids not in group_timelines:
+            group_timelines[user_ids] = SharedStream(
+                union_stream([iter(user_timelines[id]) for id in user_ids])
+            )
+        slots = free_slots(
+            iter(group_timelines[user_ids]), min_start, duration, min_start + horizon
+        )
+        results.append(
+            [{"start": start, "end": end} for start, end in take_slots(slots, count)]
+        )
+        limit_exceeded.append(limit.exceeded)
+    return api_response(request, {"results": results, "limit_exceeded": limit_exceeded})
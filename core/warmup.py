@@ -0,0 +1,15 @@
+from django.db import connections
+from django.urls import get_resolver
+
+
+def warm_up():
+    """
+    Import all views and build lazy structures of Django, so the first requests
+    of every worker don't pay for it (called once before workers are forked)
+    """
+    resolver = get_resolver()
+    # imports urlconfs with all views (and so models, caches and encoders) and
+    # populates url resolver
+    resolver.reverse_dict
+    # connections opened while importing shouldn't be shared by forked workers
+    connections.close_all()
@@ -0,0 +1,50 @@
+"""
+Production serving mode: poetry run gunicorn -c gunicorn.conf.py MyCalendar.wsgi
+Workers and threads are configured by GUNICORN_WORKERS and GUNICORN_THREADS environment variables
+"""
+import glob
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+# application is loaded once in master process and forked with all imported modules
+preload_app = True
+accesslog = "-"
+
+
+def on_starting(server):
+    # metrics of workers of previous run are not summed with new ones
+    # (it runs before application is loaded, so setting is read from environment)
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+
+
+def when_ready(server):
+    # runs in master after application is preloaded and before workers are forked
+    from django.conf import settings
+
+    from core.warmup import warm_up
+
+    if server.cfg.workers > 1 and not settings.REDIS_URL:
+        server.log.warning(
+            "Cache is local to each of %s workers, so versions, ETags and descriptions "
+            "changed by one worker are stale in others until they expire, set REDIS_URL "
+            "to share cache",
+            server.cfg.workers,
+        )
+    warm_up()
+    server.log.info("Application is warmed up")
+
+
+def worker_exit(server, worker):
+    # metrics of exiting worker are written, so they are still summed by other workers
+    from core.metrics import registry
+
+    registry.flush()